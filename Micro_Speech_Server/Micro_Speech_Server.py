@@ -1,23 +1,26 @@
+import argparse
 import asyncio
 from bleak import BleakScanner, BleakClient
-import google.generativeai as genai
+from bleak.exc import BleakError
+from collections import deque
+import functools
 import random
 import struct
+import threading
 import time
 
+from color_pool import COLOR_POOL_PATH, COLOR_POOL_TABLE, FAKE_COLOR_POOL_TABLE, PooledColorSource
+from color_sources import GAME_COLORS, FakeGeminiColorSource, GeminiColorSource, RandomColorSource, percentile
+from histograms import LATENCY_HISTOGRAMS_PATH, LatencyRegistry, latencies
+from metric_frames import decode_metrics
+from metrics_endpoint import METRICS_HOST, metrics
 
-# Get the API key from the file. Not a good method for storing an API key.
-api_file = open("GeminiAPIKey/APIKey.txt", "r")
-key = api_file.readline()
-genai.configure(api_key=key)
 
-# Initialize the Generative Model.
-model = genai.GenerativeModel(model_name="gemini-2.0-flash")
-
-generation_config = genai.types.GenerationConfig(
-    temperature=1.0,
-    top_p=0.95,
-)
+# The Gemini model is only created when it is first needed. Importing google.generativeai pulls in
+# grpc, protobuf and pydantic, so it happens in a worker thread while the BLE scan runs, and offline
+# color sources need neither the library nor an API key.
+model = None
+model_lock = threading.Lock()
 
 # Define bluetooth target device and characteristics.
 TARGET_DEVICE_NAME = "Nano33BLE"
@@ -26,273 +29,894 @@ TARGET_CHARACTERISTIC_UUID_SPEECH_READ = "00002a37-0000-1000-8000-00805f9b34fb"
 TARGET_CHARACTERISTIC_UUID_COLOR_WRITE = "f0001111-0451-4000-b000-000000000000"
 TARGET_CHARACTERISTIC_UUID_METRICS = "f0002222-0451-4000-b000-000000000000"
 
-# Maximum number of retry attempts and delay in seconds between retries.
-MAX_RETRIES = 3 
-RETRY_DELAY = 1 
-# Global variable to store BLE round-trip start time
-ble_round_trip_start_time = None
+# Session attribute and required property of each characteristic a session uses.
+REQUIRED_CHARACTERISTICS = {
+    TARGET_CHARACTERISTIC_UUID_SPEECH_READ: ("command_characteristic", "read"),
+    TARGET_CHARACTERISTIC_UUID_COLOR_WRITE: ("color_write_characteristic", "write"),
+    TARGET_CHARACTERISTIC_UUID_METRICS: ("metrics_characteristic", "notify"),
+}
+
+NUM_ROUNDS = 10
+# Seconds the player gets to read the instructions before the countdown, and pause between rounds.
+INTRO_SECONDS = 30
+ROUND_DELAY = 2
+# Seconds the player gets to answer a color.
+ANSWER_TIMEOUT = 15
 
-# Use a global variable to store the latest user response. 
-latest_user_response = None
+# Number of color sequences generated ahead of time so a game can start without waiting for Gemini.
+PREFETCH_QUEUE_SIZE = 2
 
+# Seconds to scan for boards before giving up on finding as many as were asked for.
+SCAN_TIMEOUT = 10.0
 
-# Asynchronous method for finding the characteristic for some bluetooth service.
-async def find_characteristic(client, service_uuid, characteristic_uuid, property_name):
-    for service in client.services:
-        if service.uuid == service_uuid:
-            for char in service.characteristics:
-                if char.uuid == characteristic_uuid and property_name in char.properties:
-                    return char
+# Number of boards served at once through each Bluetooth adapter. Most controllers manage about seven
+# connections, so further boards wait for a free slot.
+MAX_CONNECTIONS_PER_ADAPTER = 7
+
+# Number of riddles kept ready for the Riddle command, and seconds before a cached riddle goes stale.
+RIDDLE_PROMPT = ["Give me a riddle with four multiple choice answers where only one is right."]
+RIDDLE_CACHE_SIZE = 3
+RIDDLE_TTL = 60 * 60
+
+# Maximum number of retry attempts and delay in seconds between retries.
+MAX_RETRIES = 3 
+RETRY_DELAY = 1 
+# Seconds between reads of the command characteristic when notifications cannot be used.
+COMMAND_POLL_INTERVAL = 1
+
+# Seconds before the first reconnect attempt after a dropped or failed connection. The delay doubles
+# with each failed attempt up to the maximum, and the board is scanned for again after a few failures.
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+RECONNECT_ATTEMPTS_BEFORE_SCAN = 2
+
+# Connection states of a session.
+SCANNING = "scanning"
+CONNECTING = "connecting"
+DISCOVERING = "discovering"
+READY = "ready"
+DEGRADED = "degraded"
+
+# Marker put into a session's queues when its connection drops, to wake up whatever waits on them.
+CONNECTION_LOST = object()
+
+# Errors of a dropped or failing Bluetooth link. A game interrupted by one of them is resumed after
+# reconnecting, while any other error ends the game.
+CONNECTION_ERRORS = (BleakError, ConnectionError, OSError)
+
+
+# Method for getting the Gemini model, importing the library and creating the model on first use.
+# Blocks, so call it from a worker thread.
+def get_gemini_model():
+    global model
+    with model_lock:
+        if model is None:
+            import google.generativeai as genai
+
+            # Get the API key from the file. Not a good method for storing an API key.
+            api_file = open("GeminiAPIKey/APIKey.txt", "r")
+            key = api_file.readline()
+            genai.configure(api_key=key)
+
+            # Initialize the Generative Model.
+            model = genai.GenerativeModel(model_name="gemini-2.0-flash")
+    return model
+
+# Method for creating the color source selected on the command line. Gemini sources are served
+# from the on-disk color pool unless it is turned off, the fake one from a table of its own.
+def create_color_source(args):
+    if args.color_source == "random":
+        return RandomColorSource(seed=args.seed)
+    if args.color_source == "fake":
+        color_source = FakeGeminiColorSource(latency=args.fake_latency, distribution=args.fake_distribution, seed=args.seed)
+        table = FAKE_COLOR_POOL_TABLE
+    else:
+        color_source = GeminiColorSource(load_model=get_gemini_model)
+        table = COLOR_POOL_TABLE
+
+    if args.color_pool:
+        color_source = PooledColorSource(color_source, NUM_ROUNDS, path=args.color_pool, table=table)
+    return color_source
+
+# Asynchronous method for streaming a riddle from Gemini. Prints the text as it arrives if show is set.
+async def stream_riddle(show=True):
+    gemini_model = await asyncio.to_thread(get_gemini_model)
+    response = await gemini_model.generate_content_async(RIDDLE_PROMPT, stream=True)
+    riddle = ""
+    async for chunk in response:
+        if show:
+            print(chunk.text, end="", flush=True)
+        riddle += chunk.text
+    if show:
+        print()
+    return riddle
+
+# Bounded cache of riddles from Gemini. Each riddle is told once, riddles older than the TTL are
+# dropped, and every riddle taken is replaced by one fetched in the background.
+class RiddleCache:
+    def __init__(self, size=RIDDLE_CACHE_SIZE, ttl=RIDDLE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.riddles = deque()
+        self.refill_task = None
+        # Riddle commands being answered. The event loop only keeps weak references to tasks, so
+        # they are held here until they finish.
+        self.tell_tasks = set()
+
+    # Method for taking the oldest fresh riddle out of the cache, or None.
+    def take(self):
+        while self.riddles and time.time() - self.riddles[0][0] > self.ttl:
+            self.riddles.popleft()
+        if self.riddles:
+            return self.riddles.popleft()[1]
+        return None
+
+    # Method for telling a riddle in its own task, so the command loop does not wait for Gemini.
+    def tell_in_background(self):
+        task = asyncio.create_task(tell_riddle())
+        self.tell_tasks.add(task)
+        task.add_done_callback(self.tell_tasks.discard)
+
+    # Method for starting the background refill unless it is already running.
+    def refill_in_background(self):
+        if self.refill_task is None or self.refill_task.done():
+            self.refill_task = asyncio.create_task(self.refill())
+
+    async def refill(self):
+        while len(self.riddles) < self.size:
+            try:
+                riddle = await stream_riddle(show=False)
+            except Exception as e:
+                print(f"Error fetching a riddle from Gemini: {e}")
+                return
+            self.riddles.append((time.time(), riddle))
+
+riddle_cache = RiddleCache()
+
+# Asynchronous method for the Riddle command. Tells a cached riddle right away when there is one,
+# otherwise streams a new one from Gemini.
+async def tell_riddle():
+    riddle = riddle_cache.take()
+    if riddle is not None:
+        print(riddle)
+    else:
+        print("Asking Gemini...")
+        try:
+            await stream_riddle()
+        except Exception as e:
+            print(f"Error getting a riddle from Gemini: {e}")
+    riddle_cache.refill_in_background()
+
+# Method for an index of all characteristics by service and characteristic UUID, built in one pass.
+def index_characteristics(services):
+    index = {}
+    for service in services:
+        for char in service.characteristics:
+            index[(service.uuid, char.uuid)] = char
+    return index
+
+# Method for finding the characteristic for some bluetooth service in an index from index_characteristics.
+def find_characteristic(index, service_uuid, characteristic_uuid, property_name):
+    char = index.get((service_uuid, characteristic_uuid))
+    if char is not None and property_name in char.properties:
+        return char
     return None
 
-# Asynchronous method for finding the latency for wake word detection and BLE write.
-async def handle_metrics(characteristic, data):
-    metric = data.decode('utf-8').strip()
-    print(f"Received metric: {metric}")
-    if metric.startswith("wake_latency:"):
-        latency = float(metric.split(":")[1])
-        print(f"Wake word detection latency: {latency:.2f} ms")
-    elif metric.startswith("ble_write_latency:"):
-        latency = float(metric.split(":")[1])
-        print(f"BLE write latency (Arduino->Server): {latency:.2f} ms")
-        global ble_round_trip_start_time
-        if ble_round_trip_start_time is not None:
-            round_trip_time = (asyncio.get_event_loop().time() - ble_round_trip_start_time) * 1000
-            print(f"BLE round-trip latency: {round_trip_time:.2f} ms")
-            ble_round_trip_start_time = None # Reset
-
-# Asynchronous method for finding the characteristic for some bluetooth service
-async def handle_user_input(command_characteristic, data):
+# Progress of the game on one board. It outlives the connection, so a game whose connection drops
+# picks up again at the round that was interrupted.
+class GameProgress:
+    def __init__(self, game_colors, colors_task):
+        self.game_colors = game_colors
+        self.colors_task = colors_task
+        # Color of the round in progress, which is played again after a reconnect.
+        self.color = None
+        self.round = 0
+        self.score = 0
+        self.response_times = []
+
+# One color write and what came back for it, all in event loop time. The firmware answers without
+# echoing anything, so the answer and metrics are matched to the write by being the first ones to
+# arrive while it is the session's only write in flight.
+class RoundTrip:
+    def __init__(self, sequence, round, start_time):
+        self.sequence = sequence
+        self.round = round
+        # Taken right before write_gatt_char, then when the write was acknowledged, the answer
+        # arrived and the board's ble_write_latency metric arrived.
+        self.start_time = start_time
+        self.ack_time = None
+        self.response_time = None
+        self.metric_time = None
+
+    # Method for the time from writing the color until the board acknowledged it, in seconds.
+    def write_rtt(self):
+        return self.ack_time - self.start_time
+
+# State of one board across its connections. Each board gets its own session, so games on several
+# boards run side by side without sharing anything but the color source.
+class GameSession:
+    def __init__(self, address, color_source, client=None):
+        self.address = address
+        self.color_source = color_source
+        self.client = client
+        self.state = SCANNING
+        self.game = None
+        self.command_characteristic = None
+        self.color_write_characteristic = None
+        self.metrics_characteristic = None
+        # Handles of the characteristics found on an earlier connection by UUID. The session outlives
+        # its connections, so a reconnect only checks these instead of discovering them again.
+        self.characteristic_handles = {}
+
+        # Commands and answers arriving through the speech characteristic, and color sequences
+        # generated ahead of time so a game can start without waiting for Gemini.
+        self.command_queue = asyncio.Queue()
+        self.response_queue = asyncio.Queue()
+        self.color_queue = asyncio.Queue(maxsize=PREFETCH_QUEUE_SIZE)
+
+        # Counters for games that found a prefetched color sequence ready (hit) or had to wait (miss).
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
+
+        # Sequence number of the last color write, the write still waiting for its answer, and the
+        # latest finished round trips.
+        self.write_sequence = 0
+        self.round_trip = None
+        self.round_trips = deque(maxlen=100)
+
+        # Latency histograms of this board, which also count towards the ones of all boards.
+        self.latencies = LatencyRegistry(address, parent=latencies)
+
+        # Sequence number of the last binary metric sample, for spotting lost notifications.
+        self.metric_sequence = None
+
+    # Method for printing a message tagged with the board it is about.
+    def log(self, message, **kwargs):
+        print(f"[{self.address}] {message}", **kwargs)
+
+    def set_state(self, state):
+        if state != self.state:
+            self.log(f"Connection state: {self.state} -> {state}")
+            self.state = state
+
+    # Method for starting a connection with empty queues, so nothing from the last one leaks into it.
+    def connected(self, client):
+        self.client = client
+        self.command_queue = asyncio.Queue()
+        self.response_queue = asyncio.Queue()
+
+    # Bleak's disconnected callback. Wakes up the command loop and a game waiting for an answer.
+    def disconnected(self, client):
+        if client is not self.client:
+            return
+        self.log("Connection lost.")
+        self.set_state(DEGRADED)
+        self.command_queue.put_nowait(CONNECTION_LOST)
+        self.response_queue.put_nowait((asyncio.get_running_loop().time(), CONNECTION_LOST, None))
+
+# Connection slots of the Bluetooth adapters. A controller only keeps a handful of connections, so
+# each session takes a slot on the adapter with the most free ones, or waits until one frees up.
+class AdapterSlots:
+    def __init__(self, adapters, max_connections):
+        self.free = {adapter: max_connections for adapter in adapters}
+        self.changed = asyncio.Condition()
+
+    # Asynchronous method for taking a slot. Returns the adapter, where None is the system default.
+    async def acquire(self):
+        async with self.changed:
+            await self.changed.wait_for(lambda: max(self.free.values()) > 0)
+            adapter = max(self.free, key=self.free.get)
+            self.free[adapter] -= 1
+            return adapter
+
+    async def release(self, adapter):
+        async with self.changed:
+            self.free[adapter] += 1
+            self.changed.notify()
+
+# Asynchronous method for finding the latency for wake word detection and BLE write. A notification
+# holds either one text metric or a binary frame of several samples, see metric_frames.py.
+async def handle_metrics(session, characteristic, data):
+    try:
+        samples = decode_metrics(data)
+    except ValueError as e:
+        session.log(f"Ignoring malformed metric: {e}")
+        return
+
+    for name, sequence, timestamp, latency in samples:
+        session.log(f"Received metric: {name}:{latency:.2f}")
+        if sequence is not None:
+            if session.metric_sequence is not None and sequence != (session.metric_sequence + 1) & 0xFFFF:
+                session.log(f"Lost {(sequence - session.metric_sequence - 1) & 0xFFFF} metric samples.")
+            session.metric_sequence = sequence
+
+        # The board measures its latencies in milliseconds.
+        session.latencies.record(name, latency / 1000)
+        if name == "wake_latency":
+            session.log(f"Wake word detection latency: {latency:.2f} ms")
+        elif name == "ble_write_latency":
+            session.log(f"BLE write latency (Arduino->Server): {latency:.2f} ms")
+            # The firmware sends this metric right after the word, so it only belongs to the write in
+            # flight once that write has its answer. A late answer's metric arriving just after the next
+            # write started is not counted for it. The time it arrives is the answer time plus one
+            # notification, so it is logged but not kept in a histogram of its own.
+            round_trip = session.round_trip
+            if round_trip is not None and round_trip.response_time is not None and round_trip.metric_time is None:
+                round_trip.metric_time = asyncio.get_running_loop().time()
+                session.log(f"Metrics arrived {(round_trip.metric_time - round_trip.start_time) * 1000:.2f} ms after the color "
+                            f"(round {round_trip.round + 1}, write {round_trip.sequence})")
+
+# Asynchronous method for the player's answers. Each one goes into the session's response queue with
+# the event loop time it arrived at and the sequence number of the color write in flight, so the game
+# round can await the answer to its own color and time it exactly.
+async def handle_user_input(session, command_characteristic, data):
     # Decode and remove any whitespace.
     user_response = data.decode('utf-8').strip()
-    print(f"Arduino responded: {user_response}")
-
-    # This global variable is a simple way of interacting with the game logic.
-    global latest_user_response 
-    latest_user_response = user_response
-
-# Asynchronous method for getting a color from Gemini.
-async def get_gemini_color():
-    prompt_parts = ["Respond only with 1, 2, or 3. Pick one randomly."]
-    generation_config = genai.types.GenerationConfig(
-        temperature=0.9,
-        top_p=0.75,
-    )
-    start_time = time.time()  # Record start time before calling Gemini
-    response = await asyncio.to_thread( model.generate_content, prompt_parts, generation_config=generation_config)
-    response = (response.text).strip()
-    end_time = time.time()  # Record end time after receiving response
-    latency = end_time - start_time
-    print(f"Gemini color response latency: {latency:.4f} seconds")
-
-    # Doing numbers instead of colors to prevent model bias.
-    if response == "1":
-        response = "green"
-    elif response == "2":
-        response = "red"
-    elif response == "3":
-        response = "blue"
-
-    # Extract the text response and clean it
-    return response
-
-# Asynchronous method for asking Gemini for a list of colors.
-async def ask_gemini(num_colors=10):
-    colors = []
-    for _ in range(num_colors):
-        color = await get_gemini_color()
-        if color:
-            colors.append(color)
+    session.log(f"Arduino responded: {user_response}")
+    # An answer from before the board acknowledged the color cannot be to that color.
+    round_trip = session.round_trip
+    sequence = None
+    if round_trip is not None and round_trip.ack_time is not None and round_trip.response_time is None:
+        sequence = round_trip.sequence
+        round_trip.response_time = asyncio.get_running_loop().time()
+    session.response_queue.put_nowait((asyncio.get_running_loop().time(), user_response, sequence))
+
+# Asynchronous method for notifications on the speech characteristic, which carries both commands and
+# the player's answers. Commands go to the command queue for run_session() to dispatch, answers to the
+# response queue for the running game.
+async def handle_speech_notification(session, characteristic, data):
+    command = data.decode('utf-8').strip()
+    if command.startswith("Command:"):
+        session.command_queue.put_nowait(command)
+    else:
+        await handle_user_input(session, characteristic, data)
+
+# Asynchronous method for subscribing to the speech characteristic once for the whole connection.
+# Returns False if notifications cannot be enabled, in which case commands have to be polled.
+async def subscribe_commands(session):
+    try:
+        await session.client.start_notify(session.command_characteristic, functools.partial(handle_speech_notification, session))
+    except Exception as e:
+        session.log(f"Could not subscribe to commands, polling instead: {e}")
+        return False
+
+    # Pick up a command the Arduino wrote before the subscription.
+    data = await session.client.read_gatt_char(session.command_characteristic)
+    command = data.decode('utf-8').strip()
+    if command.startswith("Command:"):
+        session.command_queue.put_nowait(command)
+    return True
+
+# Asynchronous generator for the commands from the Arduino, as they arrive in the notification queue,
+# or by reading the characteristic every COMMAND_POLL_INTERVAL seconds as a fallback.
+async def receive_commands(session, use_notifications):
+    while True:
+        if use_notifications:
+            command = await session.command_queue.get()
+            if command is CONNECTION_LOST:
+                return
+            yield command
         else:
-            print("Warning: Could not get a valid color from Gemini.")
-    return colors
-
-# Asynchronous method for playing the color-word game.
-async def play_color_word_game(client, command_characteristic, color_write_characteristic, metrics_characteristic):
-    colors = ["green", "red", "blue"]
-    words = ["Yes", "No", "Unknown"]
-    score = 0
-    i = 0
-
-    print("Let's play the color-word game!")
-    print("Gemini will tell you a color, and you say the corresponding word into the Arduino.")
+            data = await session.client.read_gatt_char(session.command_characteristic)
+            yield data.decode('utf-8').strip()
+            await asyncio.sleep(COMMAND_POLL_INTERVAL)
+
+# Method for dropping queued commands. The firmware repeats PlayGame, so the copies that arrived
+# while a game was running must not start another one.
+def drop_stale_commands(session):
+    while not session.command_queue.empty():
+        session.log(f"Ignoring stale command: {session.command_queue.get_nowait()}")
+
+# Asynchronous method for the answer to the color write with the given sequence number. Answers that
+# belong to no write or an earlier one, e.g. late ones from the last round, are skipped. Returns the
+# arrival time and the answer, which is CONNECTION_LOST if the board went away first.
+async def wait_for_answer(session, sequence):
+    while True:
+        response_time, user_response, response_sequence = await session.response_queue.get()
+        if user_response is CONNECTION_LOST or response_sequence == sequence:
+            return response_time, user_response
+        session.log(f"Ignoring stale answer: {user_response}")
+
+# Asynchronous method for keeping the prefetch queue full of color sequences. Runs until cancelled.
+# Putting into a full queue waits, so the next sequence is generated as soon as a game takes one.
+async def prefetch_colors(session, num_colors=NUM_ROUNDS):
+    while True:
+        try:
+            colors = await session.color_source.next_colors(num_colors)
+        except Exception as e:
+            session.log(f"Error prefetching colors: {e}")
+            await asyncio.sleep(RETRY_DELAY)
+            continue
+        await session.color_queue.put(colors)
+
+# Asynchronous generator for the colors of one game. Waits for a prefetched sequence until the intro
+# is over, so the prefetch started with the session still has the intro to finish, and only streams a
+# fresh sequence if none is ready by then. The prefetch task keeps working on the next one either way.
+async def get_game_colors(session, intro, num_colors=NUM_ROUNDS):
+    prefetched = asyncio.create_task(session.color_queue.get())
+    await asyncio.wait({prefetched, intro}, return_when=asyncio.FIRST_COMPLETED)
+    if prefetched.done():
+        colors = prefetched.result()
+        session.prefetch_hits += 1
+    else:
+        prefetched.cancel()
+        session.prefetch_misses += 1
+        session.log("No prefetched colors ready. Streaming them from the color source...")
+        async for color in session.color_source.stream_colors(num_colors):
+            yield color
+        return
 
-    print("The corresponding colors and words are: green:Yes, red:No, blue:anything. Remember this!", end='\r')
-    time.sleep(30)
+    for color in colors:
+        yield color
+
+# Asynchronous method for putting the colors of one game into a queue, followed by None. It runs while
+# the intro is shown, so the colors are ready, or a streamed sequence is on its way, at the first round.
+async def queue_game_colors(session, game_colors, intro):
+    try:
+        async for color in get_game_colors(session, intro):
+            game_colors.put_nowait(color)
+    except Exception as e:
+        session.log(f"Error getting colors: {e}")
+    finally:
+        game_colors.put_nowait(None)
+
+# Asynchronous method for the intro and countdown. Awaits its timers, so BLE notifications and other
+# tasks keep running.
+async def countdown(session):
+    await asyncio.sleep(INTRO_SECONDS)
 
     # ANSI escape code to clear the line. Clears to the right of the cursor.
     print("\033[K", end='\r')
 
-    print("3...")
-    time.sleep(1)
-    print("2..")
-    time.sleep(1)
-    print("1.")
-    time.sleep(1)
+    session.log("3...")
+    await asyncio.sleep(1)
+    session.log("2..")
+    await asyncio.sleep(1)
+    session.log("1.")
+    await asyncio.sleep(1)
 
-    # Subscribe to notifications for user input.
-    await client.start_notify(command_characteristic, handle_user_input)
-    # Subscribe to notifications for metrics.
-    await client.start_notify(metrics_characteristic, handle_metrics)
+# Asynchronous method for playing the color-word game.
+async def play_color_word_game(session):
+    client = session.client
+    color_source = session.color_source
+    colors = GAME_COLORS
+    words = ["Yes", "No", "Unknown"]
+    subscribe_metrics = client.start_notify(session.metrics_characteristic, functools.partial(handle_metrics, session))
 
-    response = await ask_gemini()
+    if session.game is None:
+        session.log("Let's play the color-word game!")
+        session.log("Gemini will tell you a color, and you say the corresponding word into the Arduino.")
 
-    print(f"chosen colors: {response}")
+        session.log("The corresponding colors and words are: green:Yes, red:No, blue:anything. Remember this!", end='\r')
 
-    # Begin game loop and randomize choices.
-    for _ in range(10):
-        global latest_user_response
-        latest_user_response = None
-        timeout = 15
+        # Get everything the first round needs ready during the intro: the colors, the metrics subscription
+        # and a warm channel to the color source. The player's answers arrive through the speech
+        # characteristic subscription the session holds for the whole connection.
+        game_colors = asyncio.Queue()
+        intro = asyncio.create_task(countdown(session))
+        session.game = GameProgress(game_colors, asyncio.create_task(queue_game_colors(session, game_colors, intro)))
+        await asyncio.gather(intro, subscribe_metrics, color_source.warm_up())
+    else:
+        # The connection dropped during this game. Skip the intro and pick up at the interrupted round.
+        session.log(f"Resuming the game at round {session.game.round + 1}.")
+        await subscribe_metrics
+    game = session.game
+
+    # Begin game loop. Each round starts as soon as its color is available.
+    while True:
+        if game.color is None:
+            game.color = await game.game_colors.get()
+            if game.color is None:
+                break
+        color = game.color
 
-        print("Asking Gemini...")
-        color_index = colors.index(response[i])
+        session.log("Asking Gemini...")
+        color_index = colors.index(color)
         correct_word = words[color_index]
 
-        print(f"Gemini says: The LED will be {response[i]}. Respond on the Arduino.")
+        session.log(f"Gemini says: The LED will be {color}. Respond on the Arduino.")
 
         # Convert color into a byte for sending to the Arduino.
-        color_byte = 0
-        if response[i] == "green":
-            color_byte = 1
-        elif response[i] == "red":
-            color_byte = 2
-        elif response[i] == "blue":
-            color_byte = 3
+        color_byte = color_index + 1
+
+        # Tag the write with a sequence number, so only the answer and metrics arriving for this color
+        # count for the round.
+        session.write_sequence += 1
+        round_trip = RoundTrip(session.write_sequence, game.round, asyncio.get_running_loop().time())
+        session.round_trip = round_trip
 
         # Try to pack the integer into a byte and send it to the Arduino. Wait for an acknowledgment.
+        # A dropped connection leaves the game to be resumed after reconnecting.
         try:
-            await client.write_gatt_char(color_write_characteristic.uuid, struct.pack("<B", color_byte), response=True)
-            print(f"Sent color '{response[i]}' to Arduino.")
+            await client.write_gatt_char(session.color_write_characteristic, struct.pack("<B", color_byte), response=True)
+            round_trip.ack_time = asyncio.get_running_loop().time()
+            session.latencies.record("ble_write_rtt", round_trip.write_rtt())
+            session.log(f"Sent color '{color}' to Arduino (write {round_trip.sequence}, "
+                        f"{round_trip.write_rtt() * 1000:.1f} ms).")
         except Exception as e:
-            print(f"Error writing color: {e}")
+            session.round_trip = None
+            session.log(f"Error writing color: {e}")
+            if not client.is_connected:
+                raise
             break
 
-        # Wait for a response from the Arduino, using the notification callback.
-        start_time = asyncio.get_event_loop().time()
-        while latest_user_response is None and (asyncio.get_event_loop().time() - start_time) < timeout:
-            await asyncio.sleep(0.1)
-
-        if latest_user_response is not None:
-            print(f"Your input: {latest_user_response}")
-            if latest_user_response.lower() == correct_word.lower():
-                print("Correct!")
-                score += 1
+        # Wait for the notification callback to hand over the response to this write from the Arduino.
+        try:
+            response_time, user_response = await asyncio.wait_for(wait_for_answer(session, round_trip.sequence), ANSWER_TIMEOUT)
+        except asyncio.TimeoutError:
+            user_response = None
+            metrics.inc("answer_timeouts")
+            # Too late to count, so a late answer is not matched to this write either.
+            session.round_trip = None
+        if user_response is CONNECTION_LOST:
+            session.round_trip = None
+            raise ConnectionError(f"Connection lost in round {game.round + 1}.")
+
+        if user_response is not None:
+            game.response_times.append(response_time - round_trip.start_time)
+            session.latencies.record("answer_time", response_time - round_trip.start_time)
+            session.log(f"Your input: {user_response} ({(response_time - round_trip.start_time) * 1000:.0f} ms)")
+            if user_response.lower() == correct_word.lower():
+                session.log("Correct!")
+                game.score += 1
             else:
-                print(f"Incorrect. The correct word was '{correct_word}'.")
+                session.log(f"Incorrect. The correct word was '{correct_word}'.")
         else:
-            print("No response received from Arduino in time.")
-
-        i += 1
+            session.log("No response received from Arduino in time.")
+        session.round_trips.append(round_trip)
+        game.color = None
+        game.round += 1
+        metrics.inc("rounds_played")
 
         # Short delay between rounds.
-        await asyncio.sleep(2)
-
-    # Subscribe to notifications for user input when the game ends.
-    await client.stop_notify(command_characteristic)
-    finalscore = score/len(range(10))
-    print(f"\nGame Over! Your final score is: {finalscore}")
+        await asyncio.sleep(ROUND_DELAY)
+
+    # Stop getting colors if the game ended early, then unsubscribe from notifications for metrics.
+    game.colors_task.cancel()
+    session.game = None
+    metrics.inc("games_played")
+    await client.stop_notify(session.metrics_characteristic)
+    finalscore = game.score/NUM_ROUNDS
+    session.log(f"Game Over! Your final score is: {finalscore}")
+    if game.response_times:
+        session.log(f"Response time: p50 {percentile(game.response_times, 0.5) * 1000:.0f} ms, "
+                    f"max {max(game.response_times) * 1000:.0f} ms over {len(game.response_times)} answers")
+    for name, histogram in session.latencies.histograms.items():
+        session.log(f"Latency {name}: {histogram.describe()}")
+    for name, histogram in latencies.histograms.items():
+        session.log(f"Latency {name} on all boards: {histogram.describe()}")
+    latencies.save()
+    session.log(f"Prefetched colors: {session.prefetch_hits} hits, {session.prefetch_misses} misses")
+    if isinstance(color_source, PooledColorSource):
+        session.log(f"Color pool: {color_source.hits} hits, {color_source.misses} misses, "
+                    f"{await asyncio.to_thread(color_source.size)} sequences left")
+        color_source = color_source.source
+    if isinstance(color_source, GeminiColorSource) and color_source.requests:
+        p50, p99, hedge_rate = color_source.latency_summary()
+        session.log(f"Gemini requests: p50 {p50:.4f} seconds, p99 {p99:.4f} seconds, {hedge_rate:.0%} hedged, "
+                    f"{color_source.deadline_fallbacks} past the deadline")
 
     if (finalscore > 0.69):
-        print("You received a passing score! ^_^")
+        session.log("You received a passing score! ^_^")
     else:
-        print("You did not receive a passing score. :'(")
-
-
-# Main function to discover devices and connect to the target device.
-async def main():
-    devices = await BleakScanner.discover()
-    target_device = None
-    print("Scanning for devices...")
-
-    # Print discovered devices and check for the target device.
-    for d in devices:
-        print(f"Discovered device: {d.name} ({d.address})")
-        if d.name and TARGET_DEVICE_NAME in d.name:
-            target_device = d
-            break
-
-    # If the target device is not found, print a message and exit.
-    if not target_device:
-        print(f"Could not find device with name containing '{TARGET_DEVICE_NAME}'")
-        return
-
-    # Establish a connection to the target device and process commands.
-    async with BleakClient(target_device.address) as client:
-        print(f"Connected: {client.is_connected}")
-
-        command_characteristic = None
-        color_write_characteristic = None
-        retries = 0
-        found_all = False
-
-        # Check for services and characteristics on the bluetooth device. Implement retries.
-        while retries < MAX_RETRIES and not found_all:
-            try:
-                services = client.services
-                for service in services:
-                    print(f"[Service] {service.uuid}: {service.description}")
-                    for char in service.characteristics:
-                        print(f"  [Characteristic] {char.uuid}: {char.description} ({char.properties})")
-
-                command_characteristic = await find_characteristic(client, TARGET_SERVICE_UUID, TARGET_CHARACTERISTIC_UUID_SPEECH_READ, "read")
-                color_write_characteristic = await find_characteristic(client, TARGET_SERVICE_UUID, TARGET_CHARACTERISTIC_UUID_COLOR_WRITE, "write")
-                metrics_characteristic = await find_characteristic(client, TARGET_SERVICE_UUID, TARGET_CHARACTERISTIC_UUID_METRICS, "notify")
-
-                # Ensure that all required characteristics were found.
-                if command_characteristic and color_write_characteristic and metrics_characteristic:
-                    print("Found required characteristics.")
-                    found_all = True
-                    break
-                else:
-                    print(f"Not all characteristics found. Retrying in {RETRY_DELAY} seconds...")
-                    retries += 1
-                    await asyncio.sleep(RETRY_DELAY)
-
-            except Exception as e:
-                print(f"Error during characteristic discovery: {e}")
+        session.log("You did not receive a passing score. :'(")
+
+# Asynchronous method for playing a game and dropping the commands that queued up meanwhile. A lost
+# connection leaves the game to be resumed after reconnecting. Any other error ends the game, as
+# resuming it would only run into the same error again.
+async def play_game(session):
+    try:
+        await play_color_word_game(session)
+    except CONNECTION_ERRORS:
+        raise
+    except Exception as e:
+        if not session.client.is_connected:
+            raise
+        session.log(f"Error playing the game, ending it: {e}")
+        if session.game is not None:
+            session.game.colors_task.cancel()
+            session.game = None
+        session.round_trip = None
+    drop_stale_commands(session)
+
+# Method for setting the session's characteristics from the handles found on an earlier connection,
+# which resolve without walking the services. Returns False, and forgets the handles, when any of them
+# does not resolve to the expected characteristic, e.g. after a firmware update.
+def load_known_characteristics(session):
+    if not session.characteristic_handles:
+        return False
+
+    for uuid, (attribute, property_name) in REQUIRED_CHARACTERISTICS.items():
+        char = session.client.services.get_characteristic(session.characteristic_handles.get(uuid, -1))
+        if char is None or char.uuid != uuid or property_name not in char.properties:
+            session.log("Characteristics from the last connection are out of date. Discovering them again.")
+            session.characteristic_handles = {}
+            return False
+        setattr(session, attribute, char)
+    return True
+
+# Asynchronous method for finding the speech, color and metrics characteristics of a connected board.
+# Returns False if any of them is missing after MAX_RETRIES attempts.
+async def discover_characteristics(session):
+    client = session.client
+    retries = 0
+
+    # A reconnect to the same board needs no discovery.
+    if load_known_characteristics(session):
+        session.log("Found required characteristics from the last connection.")
+        return True
+
+    # Check for services and characteristics on the bluetooth device. Implement retries.
+    while retries < MAX_RETRIES:
+        try:
+            services = client.services
+            for service in services:
+                session.log(f"[Service] {service.uuid}: {service.description}")
+                for char in service.characteristics:
+                    session.log(f"  [Characteristic] {char.uuid}: {char.description} ({char.properties})")
+
+            index = index_characteristics(services)
+            session.command_characteristic = find_characteristic(index, TARGET_SERVICE_UUID, TARGET_CHARACTERISTIC_UUID_SPEECH_READ, "read")
+            session.color_write_characteristic = find_characteristic(index, TARGET_SERVICE_UUID, TARGET_CHARACTERISTIC_UUID_COLOR_WRITE, "write")
+            session.metrics_characteristic = find_characteristic(index, TARGET_SERVICE_UUID, TARGET_CHARACTERISTIC_UUID_METRICS, "notify")
+
+            # Ensure that all required characteristics were found, and remember their handles.
+            if session.command_characteristic and session.color_write_characteristic and session.metrics_characteristic:
+                session.log("Found required characteristics.")
+                session.characteristic_handles = {uuid: getattr(session, attribute).handle
+                                                  for uuid, (attribute, _) in REQUIRED_CHARACTERISTICS.items()}
+                return True
+            else:
+                session.log(f"Not all characteristics found. Retrying in {RETRY_DELAY} seconds...")
                 retries += 1
                 await asyncio.sleep(RETRY_DELAY)
 
-        if not command_characteristic:
-            print(f"Failed to find readable command characteristic after {MAX_RETRIES} retries.")
+        except Exception as e:
+            session.log(f"Error during characteristic discovery: {e}")
+            retries += 1
+            await asyncio.sleep(RETRY_DELAY)
+
+    if not session.command_characteristic:
+        session.log(f"Failed to find readable command characteristic after {MAX_RETRIES} retries.")
+    if not session.color_write_characteristic:
+        session.log(f"Failed to find writable color characteristic after {MAX_RETRIES} retries.")
+    if not session.metrics_characteristic:
+        session.log(f"Failed to find notifyable metrics characteristic after {MAX_RETRIES} retries.")
+    return False
+
+# Asynchronous method for serving one connected board: find its characteristics, subscribe to its
+# commands and finish a game the last connection dropped in, then dispatch commands until the
+# connection drops. Returns whether the board got ready.
+async def run_session(session):
+    session.log(f"Connected: {session.client.is_connected}")
+    session.set_state(DISCOVERING)
+    if not await discover_characteristics(session):
+        return False
+
+    # Subscribe to commands on every connection, as subscriptions end with it. They are dispatched from
+    # the notification callback through a queue, and the characteristic is only polled if notifications
+    # cannot be enabled.
+    use_notifications = await subscribe_commands(session)
+    session.set_state(READY)
+
+    # Check for commands indefinitely.
+    try:
+        if session.game is not None:
+            await play_game(session)
+
+        async for decoded_data in receive_commands(session, use_notifications):
+            session.log(f"Received command: {decoded_data}")
+
+            # Check for specific commands. The main functionality is to enable the game play with Gemini.
+            if decoded_data == "Command: PlayGame":
+                await play_game(session)
+
+            # The riddle command was used as a test case for talking to Gemini. Leaving this in for future use.
+            # It runs as its own task so the read loop and notifications keep going while Gemini answers.
+            elif decoded_data == "Command: Riddle":
+                riddle_cache.tell_in_background()
+
+    except CONNECTION_ERRORS as e:
+        session.log(f"Error reading characteristic: {e}")
+    return True
+
+# Method for the seconds to wait before the next connection attempt. Exponential backoff with jitter,
+# so boards that dropped together do not all reconnect at the same moment.
+def reconnect_delay(failures):
+    delay = min(RECONNECT_MAX_DELAY, RECONNECT_DELAY * 2 ** failures)
+    return delay * random.uniform(0.5, 1.0)
+
+# Asynchronous method for serving one board for as long as the server runs. The session goes from
+# connecting through discovering to ready, and when the connection drops or fails it is degraded
+# until a reconnect with exponential backoff succeeds. After a few failed attempts in a row the
+# board is scanned for again before connecting.
+async def serve_device(address, color_source, adapter_slots):
+    session = GameSession(address, color_source)
+    sessions[address] = session
+
+    # Start generating color sequences right away so the first game does not wait for Gemini.
+    prefetch_task = asyncio.create_task(prefetch_colors(session))
+    failures = 0
+    connections = 0
+    try:
+        while True:
+            if failures >= RECONNECT_ATTEMPTS_BEFORE_SCAN:
+                session.set_state(SCANNING)
+                found = await scan_for_devices(1, SCAN_TIMEOUT, address=address)
+            if failures < RECONNECT_ATTEMPTS_BEFORE_SCAN or found:
+                session.set_state(CONNECTING)
+                adapter = await adapter_slots.acquire()
+                try:
+                    # Only pass the adapter when one was chosen, so the platform default works everywhere.
+                    # Discovery is limited to the game's service, which saves the radio round trips of
+                    # walking the others on backends that support it.
+                    client_args = {"adapter": adapter} if adapter is not None else {}
+                    async with BleakClient(address, services=[TARGET_SERVICE_UUID], disconnected_callback=session.disconnected,
+                                           **client_args) as client:
+                        session.connected(client)
+                        connections += 1
+                        if connections > 1:
+                            metrics.inc("reconnects")
+                        try:
+                            ready = await run_session(session)
+                        finally:
+                            # Disconnecting on the way out is not a lost connection.
+                            session.client = None
+                    failures = 0 if ready else failures + 1
+                except Exception as e:
+                    session.log(f"Error connecting: {e}")
+                    failures += 1
+                finally:
+                    await adapter_slots.release(adapter)
+            else:
+                failures += 1
+
+            session.set_state(DEGRADED)
+            delay = reconnect_delay(failures)
+            session.log(f"Reconnecting in {delay:.1f} seconds...")
+            await asyncio.sleep(delay)
+    finally:
+        prefetch_task.cancel()
+        if sessions.get(address) is session:
+            del sessions[address]
+
+
+# Method for checking whether an advertisement comes from one of our boards, by its name or by the
+# service the firmware advertises.
+def is_target_device(device, advertisement_data):
+    name = advertisement_data.local_name or device.name
+    return bool(name and TARGET_DEVICE_NAME in name) or TARGET_SERVICE_UUID in advertisement_data.service_uuids
+
+# Asynchronous method for scanning until num_devices boards have advertised or timeout seconds have
+# passed, whichever comes first. Calls on_found with each board as soon as it is seen, so it can be
+# connected to while scanning continues. Only looks for the board with the given address if there is one.
+# Returns the boards found.
+async def scan_for_devices(num_devices=1, timeout=SCAN_TIMEOUT, on_found=None, address=None):
+    found = {}
+    found_all = asyncio.Event()
+
+    def detection_callback(device, advertisement_data):
+        if device.address in found or not is_target_device(device, advertisement_data):
             return
-        if not color_write_characteristic:
-            print(f"Failed to find writable color characteristic after {MAX_RETRIES} retries.")
+        if address is not None and device.address != address:
             return
-        if not metrics_characteristic:
-            print(f"Failed to find notifyable metrics characteristic after {MAX_RETRIES} retries.")
+        found[device.address] = device
+        print(f"Discovered device: {device.name} ({device.address})")
+        if on_found is not None:
+            on_found(device)
+        if len(found) >= num_devices:
+            found_all.set()
+
+    async with BleakScanner(detection_callback=detection_callback):
+        try:
+            await asyncio.wait_for(found_all.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+    return list(found.values())
+
+# Sessions of the boards being served by address, for the metrics endpoint.
+sessions = {}
+
+# Method for the number of items waiting in each queue of each session, as (labels, value) pairs.
+def queue_depths():
+    for address, session in sessions.items():
+        for queue_name in ("command", "response", "color"):
+            queue = getattr(session, f"{queue_name}_queue")
+            yield (("board", address), ("queue", queue_name)), queue.qsize()
+
+# Method for the number of boards in each connection state, as (labels, value) pairs.
+def connection_states():
+    for state in (SCANNING, CONNECTING, DISCOVERING, READY, DEGRADED):
+        yield (("state", state),), sum(session.state == state for session in sessions.values())
+
+metrics.gauge("queue_depth", "Items waiting in a board's command, response and color queues.", queue_depths)
+metrics.gauge("boards", "Boards being served by connection state.", connection_states)
+
+# Main function to scan for boards and serve each target device found in its own session.
+async def main(color_source, adapters=None, max_connections=MAX_CONNECTIONS_PER_ADAPTER, num_devices=1, scan_timeout=SCAN_TIMEOUT,
+               connect_while_scanning=False, metrics_port=None):
+    # Serve the metrics from the event loop, so scraping never holds up a board.
+    metrics_server = None
+    if metrics_port is not None:
+        metrics_server = await metrics.serve(metrics_port)
+        print(f"Serving metrics on http://{METRICS_HOST}:{metrics_port}/metrics")
+
+    # Load Gemini and open its channel while scanning so the first color request does not wait for either.
+    background_tasks = [asyncio.create_task(color_source.warm_up())]
+
+    # Top up the color pool in the background for as long as the server runs.
+    if isinstance(color_source, PooledColorSource):
+        background_tasks.append(asyncio.create_task(color_source.refill()))
+
+    # Connect to the target devices, as far as the adapters have connection slots.
+    adapter_slots = AdapterSlots(adapters or [None], max_connections)
+    serve_tasks = []
+
+    def start_serving(device):
+        serve_tasks.append(asyncio.create_task(serve_device(device.address, color_source, adapter_slots)))
+
+    try:
+        # Scanning stops as soon as enough boards are found. Boards can be connected to while it goes on.
+        print("Scanning for devices...")
+        target_devices = await scan_for_devices(num_devices, scan_timeout, start_serving if connect_while_scanning else None)
+
+        # If no target device is found, print a message and exit.
+        if not target_devices:
+            print(f"Could not find device with name containing '{TARGET_DEVICE_NAME}'")
             return
 
-        # Check for commands indefinitely.
-        while True:
-            try:
-                data = await client.read_gatt_char(command_characteristic.uuid)
-                decoded_data = data.decode('utf-8').strip()
-                print(f"Received command: {decoded_data}")
-
-                # Check for specific commands. The main functionality is to enable the game play with Gemini.
-                if decoded_data == "Command: PlayGame":
-                    await play_color_word_game(client, command_characteristic, color_write_characteristic, metrics_characteristic)
-
-                # The riddle command was used as a test case for talking to Gemini. Leaving this in for future use.
-                elif decoded_data == "Command: Riddle":
-                    print("Asking Gemini...")
-                    prompt_parts = [
-                        "Give me a riddle with four multiple choice answers where only one is right."
-                    ]
-                    response = model.generate_content(prompt_parts)
-                    print(response.text)
-
-                await asyncio.sleep(1)
-
-            except Exception as e:
-                print(f"Error reading characteristic: {e}")
-                break
-
-        print("Disconnected.")
+        if not connect_while_scanning:
+            for d in target_devices:
+                start_serving(d)
+        print(f"Serving {len(target_devices)} devices.")
+        await asyncio.gather(*serve_tasks)
+    finally:
+        # Stop the background work and the metrics endpoint with the server, e.g. when it is cancelled.
+        for task in background_tasks + serve_tasks:
+            task.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+            await metrics_server.wait_closed()
 
 
 # Entry point for the script. This is where the program starts executing.
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Micro Speech Server for the color-word game.")
+    parser.add_argument("--color-source", choices=["gemini", "random", "fake"], default="gemini",
+                        help="Where game colors come from. 'random' and 'fake' work offline without an API key.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the 'random' and 'fake' color sources.")
+    parser.add_argument("--fake-latency", type=float, default=0.5, help="Median latency in seconds of the 'fake' color source.")
+    parser.add_argument("--fake-distribution", choices=["fixed", "uniform", "exponential", "lognormal"], default="lognormal",
+                        help="Latency distribution of the 'fake' color source.")
+    parser.add_argument("--color-pool", default=COLOR_POOL_PATH, help="SQLite file of pre-generated color sequences.")
+    parser.add_argument("--no-color-pool", dest="color_pool", action="store_const", const=None,
+                        help="Always ask the color source directly.")
+    parser.add_argument("--adapters", nargs="+", default=None,
+                        help="Bluetooth adapters to connect through, e.g. hci0 hci1. Defaults to the system adapter.")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS_PER_ADAPTER,
+                        help="Boards served at once through each adapter.")
+    parser.add_argument("--devices", type=int, default=1, help="Number of boards to scan for before scanning stops.")
+    parser.add_argument("--scan-timeout", type=float, default=SCAN_TIMEOUT,
+                        help="Seconds to scan for boards if fewer than --devices are found.")
+    parser.add_argument("--connect-while-scanning", action="store_true", help="Connect to each board as soon as it is found.")
+    parser.add_argument("--latency-histograms", nargs="?", const=LATENCY_HISTOGRAMS_PATH, default=None, metavar="PATH",
+                        help=f"Write the latency histograms to this JSON file after every game (default {LATENCY_HISTOGRAMS_PATH}).")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help=f"Serve Prometheus metrics on http://{METRICS_HOST}:PORT/metrics.")
+    parser.add_argument("--fake-ble", type=int, default=0, metavar="BOARDS",
+                        help="Play against this many simulated boards instead of using Bluetooth.")
+    parser.add_argument("--fake-radio-latency", type=float, default=0.01, help="Radio latency in seconds of the simulated boards.")
+    parser.add_argument("--fake-jitter", type=float, default=0.005, help="Extra random radio latency in seconds of the simulated boards.")
+    parser.add_argument("--fake-binary-metrics", action="store_true", help="Simulated boards send binary metric frames instead of text.")
+    args = parser.parse_args()
+
+    # Swap bleak for simulated boards running the firmware's behavior, e.g. on a machine without Bluetooth.
+    if args.fake_ble:
+        from fake_ble import FakeNano33BLE, fake_bleak
+        boards = [FakeNano33BLE(f"00:00:00:00:FF:{i:02X}", radio_latency=args.fake_radio_latency, jitter=args.fake_jitter,
+                                binary_metrics=args.fake_binary_metrics, seed=None if args.seed is None else args.seed + i) for i in range(args.fake_ble)]
+        BleakScanner, BleakClient = fake_bleak(boards)
+
+    latencies.path = args.latency_histograms
+    asyncio.run(main(create_color_source(args), args.adapters, args.max_connections, args.devices, args.scan_timeout,
+                     args.connect_while_scanning, args.metrics_port))
\ No newline at end of file
@@ -0,0 +1,886 @@
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import Micro_Speech_Server as server
+from color_pool import PooledColorSource
+from color_sources import FakeGeminiColorSource, FakeGenerativeModel, GeminiColorSource, RandomColorSource, percentile
+from histograms import LatencyHistogram, LatencyRegistry
+from metric_frames import METRIC_SAMPLE, decode_metrics, encode_metric_frame
+from metrics_endpoint import Metrics
+from fake_ble import FakeBleakClient, FakeBleakScanner, FakeDevice, FakeNano33BLE, fake_bleak
+
+
+# Benchmark for comparing the sequential per-color path against the batched single request path, with
+# the concurrent per-color fan-out in between.
+async def bench_batched(latency, num_colors, repeats):
+    paths = {
+        "sequential": {"batched": False, "max_concurrency": 1},
+        "fan-out": {"batched": False},
+        "batched": {"batched": True},
+    }
+    results = {}
+    for name, options in paths.items():
+        fake_model = FakeGenerativeModel(latency=latency, seed=0)
+        color_source = GeminiColorSource(fake_model, **options)
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            colors = await color_source.next_colors(num_colors)
+            assert len(colors) == num_colors
+        elapsed = (time.perf_counter() - start_time) / repeats
+        results[name] = (elapsed, fake_model.calls / repeats)
+
+    print(f"\nFake Gemini latency {latency * 1000:.0f} ms, {num_colors} colors, {repeats} runs")
+    for name, (elapsed, calls) in results.items():
+        print(f"{name:>10}: {elapsed * 1000:8.1f} ms per sequence, {calls:.1f} requests")
+    print(f"Speedup: {results['sequential'][0] / results['batched'][0]:.1f}x")
+
+
+# Benchmark for comparing the per-color fan-out with different numbers of requests in flight.
+# A concurrency of 1 is the old serial loop.
+async def bench_fanout(latency, num_colors, concurrencies, invalid_rate):
+    print(f"\nFake Gemini latency {latency * 1000:.0f} ms, {num_colors} colors, {invalid_rate:.0%} invalid answers")
+    for concurrency in concurrencies:
+        fake_model = FakeGenerativeModel(latency=latency, seed=0, invalid_rate=invalid_rate)
+        color_source = GeminiColorSource(fake_model, batched=False, max_concurrency=concurrency)
+        start_time = time.perf_counter()
+        colors = await color_source.next_colors(num_colors)
+        elapsed = time.perf_counter() - start_time
+        assert len(colors) == num_colors
+        print(f"concurrency {concurrency:>2}: {elapsed * 1000:8.1f} ms wall-clock, {fake_model.calls} requests started")
+
+
+# Benchmark for comparing the time to the first round when streaming against waiting for the full sequence.
+async def bench_stream(latency, chunk_interval, num_colors):
+    color_source = GeminiColorSource(FakeGenerativeModel(latency=latency, seed=0, chunk_interval=chunk_interval))
+    start_time = time.perf_counter()
+    await color_source.next_colors(num_colors)
+    full_sequence = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    first_color = None
+    colors = []
+    async for color in color_source.stream_colors(num_colors):
+        if first_color is None:
+            first_color = time.perf_counter() - start_time
+        colors.append(color)
+    streamed = time.perf_counter() - start_time
+    assert len(colors) == num_colors
+
+    print(f"\nFake Gemini latency {latency * 1000:.0f} ms, {chunk_interval * 1000:.0f} ms per chunk, {num_colors} colors")
+    print(f"   batched: first round after {full_sequence * 1000:8.1f} ms")
+    print(f"  streamed: first round after {first_color * 1000:8.1f} ms, last color after {streamed * 1000:8.1f} ms")
+
+
+# Benchmark for the offline color sources: time per color sequence for the local random source and
+# the fake Gemini stand-in with each latency distribution.
+async def bench_sources(latency, num_colors, repeats):
+    color_sources = {"random": RandomColorSource(seed=0)}
+    for distribution in ("fixed", "uniform", "exponential", "lognormal"):
+        color_sources[f"fake {distribution}"] = FakeGeminiColorSource(latency=latency, distribution=distribution, seed=0)
+
+    print(f"\nMedian fake Gemini latency {latency * 1000:.0f} ms, {num_colors} colors, {repeats} runs")
+    for name, color_source in color_sources.items():
+        elapsed = []
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            colors = await color_source.next_colors(num_colors)
+            elapsed.append(time.perf_counter() - start_time)
+            assert len(colors) == num_colors
+        elapsed.sort()
+        print(f"{name:>16}: median {elapsed[len(elapsed) // 2] * 1000:8.1f} ms, max {elapsed[-1] * 1000:8.1f} ms")
+
+
+# Benchmark for comparing the old worker thread per request path with the async client. Reports the
+# threads alive after a burst of concurrent requests and the latency of the first request with and
+# without warming up the channel first.
+def bench_async_client(latency, connect_latency, requests):
+    # The old path: the blocking client called through asyncio.to_thread.
+    async def thread_path():
+        fake_model = FakeGenerativeModel(latency=latency, seed=0, connect_latency=connect_latency)
+        start_time = time.perf_counter()
+        await asyncio.to_thread(fake_model.generate_content, ["Respond only with 1, 2, or 3. Pick one randomly."])
+        first_call = time.perf_counter() - start_time
+        await asyncio.gather(*(asyncio.to_thread(fake_model.generate_content, ["Respond only with 1, 2, or 3. Pick one randomly."])
+                               for _ in range(requests)))
+        return first_call, threading.active_count()
+
+    async def async_path(warm_up):
+        color_source = GeminiColorSource(FakeGenerativeModel(latency=latency, seed=0, connect_latency=connect_latency))
+        if warm_up:
+            await color_source.warm_up()
+        start_time = time.perf_counter()
+        await color_source.get_color()
+        first_call = time.perf_counter() - start_time
+        await asyncio.gather(*(color_source.get_color() for _ in range(requests)))
+        return first_call, threading.active_count()
+
+    results = {
+        "async warm": asyncio.run(async_path(True)),
+        "async cold": asyncio.run(async_path(False)),
+        "to_thread": asyncio.run(thread_path()),
+    }
+
+    print(f"\nFake Gemini latency {latency * 1000:.0f} ms, connect {connect_latency * 1000:.0f} ms, {requests} concurrent requests")
+    for name, (first_call, threads) in results.items():
+        print(f"{name:>10}: first request {first_call * 1000:8.1f} ms, {threads} threads alive")
+
+
+# Largest difference between the measured hedge rate and the one the hedge percentile aims for.
+HEDGE_RATE_TOLERANCE = 0.05
+
+# Benchmark for hedged requests against a fake Gemini with a long latency tail. Reports p50/p99 of
+# whole requests without hedging and with hedging, how often hedges fired and how often the
+# deadline sent a request to the local fallback. Returns whether the hedge rate stayed within
+# HEDGE_RATE_TOLERANCE of the 1 - hedge_percentile the hedge delay aims for.
+async def bench_hedge(latency, sigma, requests, wave_size, hedge_percentile, deadline):
+    print(f"\nLognormal fake Gemini, median {latency * 1000:.0f} ms, sigma {sigma}, {requests} requests, deadline {deadline} s")
+    for name, percentile in (("no hedging", None), (f"hedge at p{hedge_percentile * 100:.0f}", hedge_percentile)):
+        fake_model = FakeGenerativeModel(latency=latency, distribution="lognormal", sigma=sigma, seed=0)
+        color_source = GeminiColorSource(fake_model, hedge_percentile=percentile, deadline=deadline)
+        for _ in range(requests // wave_size):
+            await asyncio.gather(*(color_source.get_color() for _ in range(wave_size)))
+        p50, p99, hedge_rate = color_source.latency_summary()
+        print(f"{name:>12}: p50 {p50 * 1000:8.1f} ms, p99 {p99 * 1000:8.1f} ms, "
+              f"{hedge_rate:.1%} hedged, {color_source.deadline_fallbacks} deadline fallbacks, {fake_model.calls} Gemini calls")
+
+    on_target = abs(hedge_rate - (1 - hedge_percentile)) <= HEDGE_RATE_TOLERANCE
+    print(f"Hedge rate {'is' if on_target else 'IS NOT'} within {HEDGE_RATE_TOLERANCE:.0%} of {1 - hedge_percentile:.0%}")
+    return on_target
+
+
+# Benchmark for game starts from the on-disk color pool. Fills a pool file, then "restarts" with a new
+# pool on the same file in front of a fake Gemini that is down (every request runs into the deadline).
+async def bench_pool(latency, num_colors, games):
+    path = os.path.join(tempfile.mkdtemp(), "color_pool.sqlite3")
+    color_pool = PooledColorSource(FakeGeminiColorSource(latency=latency, distribution="fixed", seed=0), num_colors,
+                                   path=path, capacity=games, refill_interval=0.0)
+    refill_task = asyncio.create_task(color_pool.refill())
+    while color_pool.size() < games:
+        await asyncio.sleep(0.01)
+    refill_task.cancel()
+
+    outage_source = FakeGeminiColorSource(latency=60.0, distribution="fixed", deadline=latency)
+    sources = {"pool after restart": PooledColorSource(outage_source, num_colors, path=path, capacity=games),
+               "no pool": outage_source}
+    print(f"\nGemini down, deadline {latency * 1000:.0f} ms, {games} games of {num_colors} colors")
+    for name, color_source in sources.items():
+        elapsed = []
+        for _ in range(games):
+            start_time = time.perf_counter()
+            await color_source.next_colors(num_colors)
+            elapsed.append(time.perf_counter() - start_time)
+        print(f"{name:>18}: mean game start wait {sum(elapsed) / games * 1000:8.2f} ms")
+
+
+# Method for a fake board whose player always says the right word answer_delay seconds after each color.
+def fake_board(address, radio_latency, answer_delay):
+    return FakeNano33BLE(address, radio_latency=radio_latency, answer_delay=answer_delay, reaction_sigma=0.0, accuracy=1.0)
+
+# Asynchronous method for a session connected to a fake board, with its characteristics already found.
+async def fake_session(client, color_source):
+    await client.connect()
+    session = server.GameSession(client.address, color_source, client)
+    session.command_characteristic, session.color_write_characteristic, session.metrics_characteristic = next(iter(client.services)).characteristics
+    return session
+
+# Latency test for command dispatch: time from the Arduino writing a command to the dispatch loop in
+# main() receiving it, with notifications and with the polling fallback, over a fake BLE link.
+async def bench_commands(commands, radio_latency):
+    print(f"\n{commands} commands, {radio_latency * 1000:.0f} ms radio latency")
+    for mode in ("notify", "poll"):
+        session = await fake_session(fake_board("00:00:00:00:00:00", radio_latency, 0.0).client, RandomColorSource())
+        client = session.client
+        characteristic = session.command_characteristic
+        use_notifications = mode == "notify" and await server.subscribe_commands(session)
+        write_times = {}
+
+        # The Arduino sends a new command every few hundred milliseconds.
+        async def firmware():
+            rng = random.Random(0)
+            for i in range(commands):
+                await asyncio.sleep(rng.uniform(0.3, 1.2))
+                write_times[f"Command: Test {i}"] = time.perf_counter()
+                client.peripheral_write(characteristic.uuid, f"Command: Test {i}")
+
+        firmware_task = asyncio.create_task(firmware())
+        latencies = {}
+        async for command in server.receive_commands(session, use_notifications):
+            if command in write_times and command not in latencies:
+                latencies[command] = time.perf_counter() - write_times[command]
+            # Polling misses commands that are overwritten between two reads, so stop at the last one.
+            if f"Command: Test {commands - 1}" in latencies:
+                break
+        await firmware_task
+
+        missed = commands - len(latencies)
+        latencies = list(latencies.values())
+        print(f"{mode:>6}: command to handler p50 {percentile(latencies, 0.5) * 1000:8.1f} ms, "
+              f"max {max(latencies) * 1000:8.1f} ms, {missed} commands missed")
+
+
+# Asynchronous method for sampling event loop lag, how late a timer of interval seconds fires, into lags.
+# Runs until cancelled.
+async def monitor_loop_lag(lags, interval=0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        start_time = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start_time - interval)
+
+# Responsiveness test for the game intro: event loop lag during a whole game over a fake BLE link with
+# a streaming fake Gemini, next to an intro that calls time.sleep like the game used to. Returns whether
+# the game's maximum lag stayed within max_lag seconds.
+async def bench_loop_lag(intro, latency, radio_latency, answer_delay, max_lag):
+    server.INTRO_SECONDS = intro
+    server.ROUND_DELAY = 0.1
+
+    async def blocking_intro():
+        time.sleep(intro + 3)
+
+    async def game():
+        color_source = FakeGeminiColorSource(latency=latency, distribution="fixed", seed=0)
+        session = await fake_session(fake_board("00:00:00:00:00:00", radio_latency, answer_delay).client, color_source)
+        await server.subscribe_commands(session)
+        await server.play_color_word_game(session)
+
+    print(f"\n{intro:.0f} s intro, fake Gemini {latency * 1000:.0f} ms, {radio_latency * 1000:.0f} ms radio latency")
+    for name, run in (("time.sleep intro", blocking_intro), ("game", game)):
+        lags = []
+        monitor_task = asyncio.create_task(monitor_loop_lag(lags))
+        await asyncio.sleep(0)
+        start_time = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await run()
+        elapsed = time.perf_counter() - start_time
+        # Give the monitor a chance to record the timer that was due while the loop was blocked.
+        await asyncio.sleep(0.02)
+        monitor_task.cancel()
+        print(f"{name:>16}: loop lag p50 {percentile(lags, 0.5) * 1000:8.1f} ms, p99 {percentile(lags, 0.99) * 1000:8.1f} ms, "
+              f"max {max(lags) * 1000:8.1f} ms over {elapsed:.1f} s")
+
+    # The lags of the game are the last ones measured.
+    responsive = max(lags) <= max_lag
+    print(f"Game loop lag {'stays' if responsive else 'DOES NOT STAY'} within {max_lag * 1000:.0f} ms")
+    return responsive
+
+# Load test for the session manager: main() serving many fake boards at once, each of which asks for
+# one game right after starting. Reports how long the games took and the connections per adapter.
+# Returns whether every game got all its rounds and was over within timeout seconds.
+async def bench_sessions(boards, adapters, max_connections, latency, radio_latency, answer_delay, timeout):
+    server.INTRO_SECONDS = 1.0
+    server.ROUND_DELAY = 0.1
+    fake_boards = [fake_board(f"00:00:00:00:{i // 256:02X}:{i % 256:02X}", radio_latency, answer_delay) for i in range(boards)]
+    server.BleakScanner, server.BleakClient = fake_bleak(fake_boards)
+    color_source = FakeGeminiColorSource(latency=latency, seed=0)
+    adapter_names = [f"hci{i}" for i in range(adapters)]
+
+    lags = []
+    monitor_task = asyncio.create_task(monitor_loop_lag(lags))
+    peak_connections = {adapter: 0 for adapter in adapter_names}
+    output = io.StringIO()
+
+    # Method for the boards whose game is over. A round played again after a reconnect means a board
+    # can get more than NUM_ROUNDS colors.
+    def games_over():
+        log = output.getvalue()
+        return [board for board in fake_boards
+                if len(board.colors_received) >= server.NUM_ROUNDS and f"[{board.address}] Game Over!" in log]
+
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        main_task = asyncio.create_task(server.main(color_source, adapter_names, max_connections, boards))
+        # Give up on boards that stall once the timeout has passed.
+        while len(games_over()) < boards and time.perf_counter() - start_time < timeout:
+            for adapter in adapter_names:
+                connected = sum(board.client.is_connected and board.client.adapter == adapter for board in fake_boards)
+                peak_connections[adapter] = max(peak_connections[adapter], connected)
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start_time
+        main_task.cancel()
+        monitor_task.cancel()
+
+    finished = games_over()
+    game_times = [board.colors_received[-1] + answer_delay - start_time for board in finished]
+    print(f"\n{boards} boards, {adapters} adapters of {max_connections} connections, fake Gemini {latency * 1000:.0f} ms, "
+          f"{radio_latency * 1000:.0f} ms radio latency")
+    if game_times:
+        print(f"Games of {server.INTRO_SECONDS + 3:.0f} s intro and countdown plus {server.NUM_ROUNDS} rounds: "
+              f"over after p50 {percentile(game_times, 0.5):.2f} s, max {max(game_times):.2f} s, all done in {elapsed:.2f} s")
+    print(f"Peak connections per adapter: {max(peak_connections.values())}, "
+          f"loop lag p99 {percentile(lags, 0.99) * 1000:.1f} ms, max {max(lags) * 1000:.1f} ms")
+    print(f"{len(finished)} of {boards} games over within {timeout:.0f} s")
+    return len(finished) == boards
+
+# Correlation test for color writes: games on several fake boards at once over a jittery link, with
+# players slow enough that some answers come in after the round gave up on them. Reports the round trip
+# of the color writes and answers, and how many answers and metrics were matched to the right write.
+async def bench_rtt(boards, radio_latency, jitter, answer_delay, reaction_sigma):
+    server.INTRO_SECONDS = 0.0
+    server.ROUND_DELAY = 0.1
+    server.ANSWER_TIMEOUT = answer_delay * 2
+
+    async def game(i):
+        board = FakeNano33BLE(f"00:00:00:00:00:{i:02X}", radio_latency=radio_latency, jitter=jitter, answer_delay=answer_delay,
+                              reaction_sigma=reaction_sigma, accuracy=1.0, seed=i)
+        session = await fake_session(board.client, RandomColorSource(seed=i))
+        await server.subscribe_commands(session)
+        await server.play_color_word_game(session)
+        return session
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        sessions = await asyncio.gather(*(game(i) for i in range(boards)))
+    round_trips = [round_trip for session in sessions for round_trip in session.round_trips]
+    write_rtts = [round_trip.write_rtt() for round_trip in round_trips]
+    answered = [round_trip for round_trip in round_trips if round_trip.response_time is not None]
+    answer_times = [round_trip.response_time - round_trip.start_time for round_trip in answered]
+    with_metric = sum(round_trip.metric_time is not None for round_trip in answered)
+
+    # Every player says the right word, so an answer matched to the wrong write scores as incorrect.
+    log = output.getvalue()
+    print(f"\n{boards} boards, {radio_latency * 1000:.0f} ms radio latency plus up to {jitter * 1000:.0f} ms jitter, "
+          f"answers after {answer_delay * 1000:.0f} ms (sigma {reaction_sigma}), {server.ANSWER_TIMEOUT * 1000:.0f} ms timeout")
+    print(f"Color write round trip: p50 {percentile(write_rtts, 0.5) * 1000:.1f} ms, "
+          f"p99 {percentile(write_rtts, 0.99) * 1000:.1f} ms over {len(write_rtts)} writes")
+    print(f"Answer round trip: p50 {percentile(answer_times, 0.5) * 1000:.0f} ms, "
+          f"p99 {percentile(answer_times, 0.99) * 1000:.0f} ms over {len(answered)} answered rounds")
+    print(f"Rounds timed out: {len(round_trips) - len(answered)}, late answers ignored: {log.count('Ignoring stale answer')}, "
+          f"answers matched to the wrong color: {log.count('Incorrect.')}, answered rounds with metrics: {with_metric}")
+
+# Recovery test for a connection that drops in the middle of a round: main() serves one fake board,
+# which goes out of range for downtime seconds. Reports the time until the interrupted round is played
+# again and checks that the game still ends after NUM_ROUNDS rounds.
+async def bench_reconnect(drop_round, downtimes, radio_latency, answer_delay):
+    server.INTRO_SECONDS = 1.0
+    server.ROUND_DELAY = 0.1
+    print(f"\nConnection dropped in round {drop_round + 1}, {radio_latency * 1000:.0f} ms radio latency, "
+          "restarting instead costs a scan plus the 33 s intro")
+    for downtime in downtimes:
+        board = fake_board("00:00:00:00:00:00", radio_latency, answer_delay)
+        server.BleakScanner, server.BleakClient = fake_bleak([board])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main_task = asyncio.create_task(server.main(RandomColorSource(seed=0)))
+            while len(board.colors_received) <= drop_round:
+                await asyncio.sleep(0.01)
+            # Drop the link while the player is thinking about the answer.
+            await asyncio.sleep(answer_delay / 2)
+            drop_time = time.perf_counter()
+            board.client.peripheral_disconnect(downtime)
+            while len(board.colors_received) <= drop_round + 1:
+                await asyncio.sleep(0.01)
+            recovery_time = board.colors_received[-1] - drop_time
+            while "Game Over" not in output.getvalue():
+                await asyncio.sleep(0.01)
+            main_task.cancel()
+
+        log = output.getvalue()
+        rounds = log.count("Your input:") + log.count("No response received")
+        print(f"{downtime:4.1f} s out of range: round played again after {recovery_time * 1000:7.0f} ms, "
+              f"{log.count('Reconnecting in')} reconnects, {log.count('-> scanning')} scans, {rounds} rounds played")
+
+# Benchmark for time to connect: a full BleakScanner.discover() scan like the server used to do, against
+# scanning that stops once the boards are found, and connecting to each board as soon as it is seen.
+async def bench_scan(boards, discover_timeout, connect_latency):
+    rng = random.Random(0)
+    devices = [FakeDevice(server.TARGET_DEVICE_NAME, f"00:00:00:00:00:{i:02X}", [server.TARGET_SERVICE_UUID], rng.uniform(0.05, 2.0))
+               for i in range(boards)]
+    # Other devices in range advertise too.
+    devices += [FakeDevice(f"Phone {i}", f"00:00:00:00:01:{i:02X}", advertising_delay=rng.uniform(0.0, 0.5)) for i in range(5)]
+    server.BleakScanner = functools.partial(FakeBleakScanner, devices)
+
+    async def scan_and_connect(mode):
+        connected_times = []
+        connect_tasks = []
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+
+        async def connect(device):
+            await FakeBleakClient(device.address, radio_latency=connect_latency).connect()
+            connected_times.append(loop.time() - start_time)
+
+        def start_connecting(device):
+            connect_tasks.append(asyncio.create_task(connect(device)))
+
+        if mode == "discover":
+            found = [d for d in await FakeBleakScanner(devices).discover(discover_timeout) if d.name and server.TARGET_DEVICE_NAME in d.name]
+            for d in found[:boards]:
+                start_connecting(d)
+        elif mode == "early exit":
+            for d in await server.scan_for_devices(boards, discover_timeout):
+                start_connecting(d)
+        else:
+            await server.scan_for_devices(boards, discover_timeout, start_connecting)
+        await asyncio.gather(*connect_tasks)
+        return connected_times
+
+    print(f"\n{boards} boards advertising within 2 s, {discover_timeout:.0f} s discover timeout, {connect_latency * 1000:.0f} ms to connect")
+    for mode in ("discover", "early exit", "connect while scanning"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            connected_times = await scan_and_connect(mode)
+        print(f"{mode:>22}: first board connected after {min(connected_times) * 1000:7.0f} ms, "
+              f"all after {max(connected_times) * 1000:7.0f} ms")
+
+# Benchmark for finding the characteristics on each connection to the same board: discovery on every
+# connection, a session that reconnects with the handles it found before, and one whose handles went stale.
+async def bench_discovery(connections):
+    client = fake_board("00:00:00:00:00:00", 0.0, 0.0).client
+    reconnecting_session = server.GameSession(client.address, RandomColorSource(), client)
+    stale_session = server.GameSession(client.address, RandomColorSource(), client)
+    stale_session.characteristic_handles = {uuid: 999 for uuid in server.REQUIRED_CHARACTERISTICS}
+    sessions = {
+        "first connection": lambda: server.GameSession(client.address, RandomColorSource(), client),
+        "reconnect": lambda: reconnecting_session,
+        "stale handles": lambda: stale_session,
+    }
+
+    print(f"\n{connections} connections to one board")
+    for name, get_session in sessions.items():
+        elapsed = 0.0
+        discoveries = 0
+        for _ in range(connections):
+            session = get_session()
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                start_time = time.perf_counter()
+                found = await server.discover_characteristics(session)
+                elapsed += time.perf_counter() - start_time
+            assert found
+            discoveries += "[Service]" in output.getvalue()
+        print(f"{name:>16}: {elapsed / connections * 1e6:8.1f} us per connection, {discoveries} full discoveries")
+
+# Benchmark for decoding metrics notifications: the firmware's text metrics, parsed the way the server
+# used to and with decode_metrics, against binary frames of samples_per_frame samples.
+def bench_metrics(samples, samples_per_frame):
+    rng = random.Random(0)
+    values = [("wake_latency" if i % 2 else "ble_write_latency", i, i * 1000, rng.uniform(0.0, 100.0)) for i in range(samples)]
+    texts = [f"{name}:{value:.2f}".encode("utf-8") for name, _, _, value in values]
+    frames = [encode_metric_frame(values[i:i + samples_per_frame]) for i in range(0, samples, samples_per_frame)]
+
+    def parse_text_like_before():
+        for data in texts:
+            metric = data.decode('utf-8').strip()
+            if metric.startswith("wake_latency:"):
+                float(metric.split(":")[1])
+            elif metric.startswith("ble_write_latency:"):
+                float(metric.split(":")[1])
+
+    def decode_texts():
+        for data in texts:
+            decode_metrics(data)
+
+    def decode_frames():
+        for data in frames:
+            decode_metrics(data)
+
+    cases = {"text, old parser": (parse_text_like_before, texts), "text": (decode_texts, texts),
+             f"binary, {samples_per_frame} per frame": (decode_frames, frames)}
+    print(f"\n{samples} metric samples, {METRIC_SAMPLE.size} bytes per binary sample")
+    for name, (decode, notifications) in cases.items():
+        start_time = time.perf_counter()
+        decode()
+        elapsed = time.perf_counter() - start_time
+        size = sum(len(data) for data in notifications)
+        print(f"{name:>20}: {elapsed / samples * 1e9:7.0f} ns per sample, {len(notifications):6} notifications, "
+              f"{size / samples:5.1f} bytes per sample")
+
+# Cost and accuracy of the latency histograms next to keeping every sample in a list and sorting it
+# for the percentiles, for lognormal latencies around answer_time seconds.
+def bench_histograms(samples, answer_time):
+    rng = random.Random(0)
+    values = [answer_time * rng.lognormvariate(0.0, 0.5) for _ in range(samples)]
+
+    start_time = time.perf_counter()
+    kept = []
+    for value in values:
+        kept.append(value)
+    exact = {fraction: percentile(kept, fraction) for fraction in (0.5, 0.9, 0.99)}
+    list_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    record_time = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    estimates = {fraction: histogram.percentile(fraction) for fraction in exact}
+    percentile_time = time.perf_counter() - start_time
+
+    error = max(abs(estimates[fraction] - exact[fraction]) / exact[fraction] for fraction in exact)
+    print(f"\n{samples} latencies around {answer_time * 1000:.0f} ms")
+    print(f"     list: {list_time / samples * 1e9:5.0f} ns per sample with percentiles, {sys.getsizeof(kept) + 24 * samples} bytes")
+    print(f"histogram: {record_time / samples * 1e9:5.0f} ns per sample, {percentile_time * 1000:.2f} ms for percentiles, "
+          f"{histogram.counts.itemsize * len(histogram.counts)} bytes, worst percentile error {error:.2%}")
+
+# Cost of scraping the metrics endpoint of a server with many boards and a long history: the time to
+# render the metrics, and scrape latency and event loop lag while a scraper polls as fast as it can.
+async def bench_scrape(boards, samples, scrapes):
+    registry = LatencyRegistry()
+    rng = random.Random(0)
+    for name in ("gemini_request", "ble_write_rtt", "answer_time", "wake_latency", "ble_write_latency"):
+        for _ in range(samples):
+            registry.record(name, 0.05 * rng.lognormvariate(0.0, 1.0))
+    bench_metrics = Metrics(registry)
+    bench_metrics.gauge("queue_depth", "Items waiting in a board's queues.", server.queue_depths)
+    for i in range(boards):
+        server.sessions[f"00:00:00:00:{i // 256:02X}:{i % 256:02X}"] = server.GameSession(f"board {i}", RandomColorSource())
+
+    start_time = time.perf_counter()
+    text = bench_metrics.render()
+    render_time = time.perf_counter() - start_time
+
+    lags = []
+    monitor_task = asyncio.create_task(monitor_loop_lag(lags, 0.001))
+    metrics_server = await bench_metrics.serve(0)
+    port = metrics_server.sockets[0].getsockname()[1]
+    scrape_times = []
+    for _ in range(scrapes):
+        start_time = time.perf_counter()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await reader.read()
+        writer.close()
+        scrape_times.append(time.perf_counter() - start_time)
+    monitor_task.cancel()
+    metrics_server.close()
+    await metrics_server.wait_closed()
+    server.sessions.clear()
+
+    print(f"\n{boards} boards, 6 latency histograms of {samples} samples each, {len(text.splitlines())} lines, {len(text)} bytes")
+    print(f"Render {render_time * 1000:.2f} ms, scrape p50 {percentile(scrape_times, 0.5) * 1000:.2f} ms, "
+          f"p99 {percentile(scrape_times, 0.99) * 1000:.2f} ms, loop lag max {max(lags) * 1000:.2f} ms over {scrapes} scrapes")
+
+# Directory of the test clips that come with the firmware.
+AUDIO_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "micro_speech_BLE", "data")
+
+# Method for a batch of one second test clips: the firmware's yes and no clips at random gains with
+# random noise added.
+def test_clips(clips, seed=0):
+    import numpy as np
+    from micro_frontend import read_wav
+    words = [read_wav(os.path.join(AUDIO_DATA_DIR, f"{word}_1000ms.wav")) for word in ("yes", "no")]
+    rng = np.random.default_rng(seed)
+    batch = np.stack([words[i % 2] for i in range(clips)]) * rng.uniform(0.2, 2.0, (clips, 1))
+    batch += rng.normal(0.0, rng.uniform(10, 300, (clips, 1)), batch.shape)
+    return np.clip(np.round(batch), -32768, 32767).astype(np.int16)
+
+# Throughput test for the host frontend: features for a batch of clips computed one window at a time
+# like the firmware does, one clip at a time, and for the whole batch in one call, in floating point
+# and in the frontend library's fixed point arithmetic.
+def bench_frontend(clips):
+    import numpy as np
+    from micro_frontend import MicroFrontend
+    frontend = MicroFrontend()
+    batch = test_clips(clips)
+
+    # One window per FFT and filterbank product, with the noise estimate kept in between.
+    def per_window(clip):
+        estimate = np.zeros(frontend.num_channels, dtype=np.float32)
+        for frame in frontend.frames(clip):
+            spectrum = np.fft.rfft(frame.astype(np.float32) * frontend.window, n=frontend.fft_size)
+            signal = np.floor(np.sqrt((spectrum.real ** 2 + spectrum.imag ** 2) @ frontend.filterbank) / 8)
+            estimate = frontend.smoothing * signal + (1 - frontend.smoothing) * estimate
+
+    cases = {
+        "per window": lambda: [per_window(clip) for clip in batch[:max(1, clips // 20)]],
+        "per clip": lambda: [frontend.features(clip) for clip in batch],
+        "batch": lambda: frontend.features(batch),
+        "per clip fixed": lambda: [frontend.features(clip, fixed_point=True) for clip in batch],
+        "batch fixed": lambda: frontend.features(batch, fixed_point=True),
+    }
+    print(f"\n{clips} one second clips, {frontend.frames(batch[0]).shape[0]} windows of {frontend.num_channels} channels each")
+    for name, run in cases.items():
+        start_time = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start_time
+        done = max(1, clips // 20) if name == "per window" else clips
+        print(f"{name:>14}: {done / elapsed:8.0f} clips per second")
+
+    # How far the floating point features are from the fixed point ones the board computes.
+    difference = np.abs(frontend.int8_features(batch).astype(np.int32) - frontend.int8_features(batch, fixed_point=True))
+    print(f"Floating point int8 features: mean difference {difference.mean():.2f}, max {difference.max()}, "
+          f"{(difference == 0).mean() * 100:.1f}% identical")
+
+# Conformance test for the fixed point host frontend: the firmware's test clips against golden
+# vectors from the frontend library, which have to match output for output. Returns whether all do.
+def check_conformance(golden_path):
+    import json
+    import numpy as np
+    from micro_frontend import MicroFrontend, quantize_features, read_wav
+    frontend = MicroFrontend()
+    with open(golden_path) as golden_file:
+        golden = json.load(golden_file)
+
+    passed = True
+    for test in golden["test data"]:
+        audio = read_wav(os.path.join(os.path.dirname(golden_path), test["file name"]))
+        expected_outputs = np.array(test["frontend outputs"], dtype=np.uint16)
+        expected_features = np.array(test["int8 features"], dtype=np.int8)
+        outputs = frontend.features(audio, fixed_point=True)
+        features = quantize_features(outputs)
+        float_features = frontend.int8_features(audio)
+        matched = outputs.shape == expected_outputs.shape and (outputs == expected_outputs).all() and (features == expected_features).all()
+        passed = passed and bool(matched)
+        print(f"{test['file name']}: fixed point {'matches' if matched else 'DOES NOT MATCH'}"
+              + ("" if matched or outputs.shape != expected_outputs.shape else
+                 f" ({(outputs != expected_outputs).sum()} of {outputs.size} outputs differ)")
+              + f", floating point int8 features off by {np.abs(float_features.astype(np.int32) - expected_features).mean():.2f} on average")
+    return passed
+
+# Throughput test for the host model interpreter: the wake word model scored on the fixed point
+# features of a batch of clips, one input per call and the whole batch in one call, and how many of
+# the clips it hears as the word they hold.
+def bench_model(clips):
+    import numpy as np
+    from micro_frontend import MicroFrontend
+    from micro_model import MODEL_LABELS, load_model
+    start_time = time.perf_counter()
+    model = load_model()
+    print(f"\nModel loaded from the C array in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+    features = MicroFrontend().int8_features(test_clips(clips), fixed_point=True)
+
+    cases = {
+        "per input": lambda: [model.invoke(input) for input in features],
+        "batch": lambda: model.invoke(features),
+    }
+    for name, run in cases.items():
+        start_time = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start_time
+        print(f"{name:>10}: {clips / elapsed:8.0f} inputs per second")
+
+    heard = model.labels(features)
+    words = np.array(["yes", "no"])[np.arange(clips) % 2]
+    counts = ", ".join(f"{label} {(heard == label).sum()}" for label in MODEL_LABELS)
+    print(f"Heard {counts}; {(heard == words).mean() * 100:.1f}% as the word in the clip")
+
+# Script run in a fresh interpreter by the startup benchmark. Prints the seconds from just before the
+# interpreter was started until the BLE scan starts, then exits. "eager" imports the Gemini library
+# up front like the server used to.
+STARTUP_PROBE = """
+import asyncio, os, sys, time
+if sys.argv[1] == "eager":
+    import google.generativeai
+import Micro_Speech_Server as server
+
+async def scan_for_devices(*args, **kwargs):
+    print(time.time() - float(os.environ["STARTUP_BENCH_START"]))
+    sys.stdout.flush()
+    os._exit(0)
+
+server.scan_for_devices = scan_for_devices
+asyncio.run(server.main(server.GeminiColorSource(load_model=server.get_gemini_model)))
+"""
+
+# Method for the cumulative -X importtime of a module in microseconds, and of each import it
+# makes directly, heaviest first.
+def import_times(module):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True)
+    total = 0
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level under the import that pulled them in.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == module:
+            total = int(cumulative)
+            break
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative)))
+        elif depth == 0:
+            children.clear()
+    return total, sorted(children, key=lambda child: child[1], reverse=True)
+
+# Benchmark for server startup: time from launching the interpreter to the start of the BLE scan,
+# with the lazy Gemini import and with the library imported up front, plus the heaviest imports.
+def bench_startup(runs):
+    print(f"\nTime to scan start, median of {runs} runs")
+    for mode in ("lazy", "eager"):
+        samples = []
+        for _ in range(runs):
+            env = dict(os.environ, STARTUP_BENCH_START=str(time.time()))
+            result = subprocess.run([sys.executable, "-c", STARTUP_PROBE, mode], capture_output=True, text=True, env=env, check=True)
+            samples.append(float(result.stdout.strip().splitlines()[-1]))
+        samples.sort()
+        print(f"{mode:>6}: {samples[len(samples) // 2] * 1000:8.1f} ms")
+
+    for module in ("Micro_Speech_Server", "google.generativeai"):
+        total, children = import_times(module)
+        print(f"\n-X importtime for {module}: {total / 1000:.1f} ms, heaviest imports:")
+        for name, cumulative in children[:5]:
+            print(f"{name:>32}: {cumulative / 1000:8.1f} ms")
+
+
+# Entry point for the benchmarks. Run from this directory so the server module can be imported.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Micro Speech Server.")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    batched_parser = subparsers.add_parser("batched", help="Sequential vs batched Gemini color generation.")
+    batched_parser.add_argument("--latency", type=float, default=0.5, help="Fake Gemini latency in seconds.")
+    batched_parser.add_argument("--colors", type=int, default=server.NUM_ROUNDS)
+    batched_parser.add_argument("--repeats", type=int, default=3)
+
+    fanout_parser = subparsers.add_parser("fanout", help="Per-color Gemini requests with bounded concurrency.")
+    fanout_parser.add_argument("--latency", type=float, default=0.5, help="Fake Gemini latency in seconds.")
+    fanout_parser.add_argument("--colors", type=int, default=server.NUM_ROUNDS)
+    fanout_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    fanout_parser.add_argument("--invalid-rate", type=float, default=0.1)
+
+    stream_parser = subparsers.add_parser("stream", help="Time to first round when streaming the color sequence.")
+    stream_parser.add_argument("--latency", type=float, default=0.5, help="Fake Gemini time to first token in seconds.")
+    stream_parser.add_argument("--chunk-interval", type=float, default=0.01, help="Fake Gemini time per chunk in seconds.")
+    stream_parser.add_argument("--colors", type=int, default=server.NUM_ROUNDS)
+
+    sources_parser = subparsers.add_parser("sources", help="Time per sequence for the offline color sources.")
+    sources_parser.add_argument("--latency", type=float, default=0.1, help="Median fake Gemini latency in seconds.")
+    sources_parser.add_argument("--colors", type=int, default=server.NUM_ROUNDS)
+    sources_parser.add_argument("--repeats", type=int, default=20)
+
+    async_client_parser = subparsers.add_parser("async-client", help="Worker threads vs the async client, with and without warm-up.")
+    async_client_parser.add_argument("--latency", type=float, default=0.1, help="Fake Gemini latency in seconds.")
+    async_client_parser.add_argument("--connect-latency", type=float, default=0.3, help="Fake channel setup time in seconds.")
+    async_client_parser.add_argument("--requests", type=int, default=10)
+
+    hedge_parser = subparsers.add_parser("hedge", help="Tail latency with and without hedged requests.")
+    hedge_parser.add_argument("--latency", type=float, default=0.1, help="Median fake Gemini latency in seconds.")
+    hedge_parser.add_argument("--sigma", type=float, default=1.0, help="Sigma of the lognormal fake Gemini latency.")
+    hedge_parser.add_argument("--requests", type=int, default=500)
+    hedge_parser.add_argument("--wave-size", type=int, default=25)
+    hedge_parser.add_argument("--hedge-percentile", type=float, default=0.9)
+    hedge_parser.add_argument("--deadline", type=float, default=2.0, help="Seconds before falling back to local colors.")
+
+    pool_parser = subparsers.add_parser("pool", help="Game start wait with the on-disk color pool during an outage.")
+    pool_parser.add_argument("--latency", type=float, default=0.2, help="Fake Gemini latency and outage deadline in seconds.")
+    pool_parser.add_argument("--colors", type=int, default=server.NUM_ROUNDS)
+    pool_parser.add_argument("--games", type=int, default=5)
+
+    startup_parser = subparsers.add_parser("startup", help="Time from launch to BLE scan start, with import times.")
+    startup_parser.add_argument("--runs", type=int, default=5)
+
+    commands_parser = subparsers.add_parser("commands", help="Command to handler latency, notifications vs polling.")
+    commands_parser.add_argument("--commands", type=int, default=10)
+    commands_parser.add_argument("--radio-latency", type=float, default=0.01, help="Fake BLE latency in seconds.")
+
+    loop_lag_parser = subparsers.add_parser("loop-lag", help="Event loop lag during a game, with the old blocking intro for reference.")
+    loop_lag_parser.add_argument("--intro", type=float, default=2.0, help="Seconds of intro before the countdown.")
+    loop_lag_parser.add_argument("--latency", type=float, default=0.5, help="Fake Gemini time to first token in seconds.")
+    loop_lag_parser.add_argument("--radio-latency", type=float, default=0.01, help="Fake BLE latency in seconds.")
+    loop_lag_parser.add_argument("--answer-delay", type=float, default=0.3, help="Seconds the fake player takes to answer.")
+    loop_lag_parser.add_argument("--max-lag", type=float, default=0.05, help="Seconds of loop lag in the game that fail the test.")
+
+    sessions_parser = subparsers.add_parser("sessions", help="Load test of main() serving many fake boards at once.")
+    sessions_parser.add_argument("--boards", type=int, default=50)
+    sessions_parser.add_argument("--adapters", type=int, default=8)
+    sessions_parser.add_argument("--max-connections", type=int, default=server.MAX_CONNECTIONS_PER_ADAPTER)
+    sessions_parser.add_argument("--latency", type=float, default=0.5, help="Median fake Gemini latency in seconds.")
+    sessions_parser.add_argument("--radio-latency", type=float, default=0.01, help="Fake BLE latency in seconds.")
+    sessions_parser.add_argument("--answer-delay", type=float, default=0.3, help="Seconds the fake players take to answer.")
+    sessions_parser.add_argument("--timeout", type=float, default=60.0, help="Seconds all games get to be over.")
+
+    scan_parser = subparsers.add_parser("scan", help="Time to connect with a full scan, an early-exit scan and connecting while scanning.")
+    scan_parser.add_argument("--boards", type=int, default=1)
+    scan_parser.add_argument("--discover-timeout", type=float, default=5.0, help="Scan time of BleakScanner.discover().")
+    scan_parser.add_argument("--connect-latency", type=float, default=0.3, help="Seconds a fake connection takes.")
+
+
+    reconnect_parser = subparsers.add_parser("reconnect", help="Game recovery after the connection drops mid-round.")
+    reconnect_parser.add_argument("--drop-round", type=int, default=3, help="Zero-based round the connection drops in.")
+    reconnect_parser.add_argument("--downtime", type=float, nargs="+", default=[0.0, 3.0], help="Seconds the board is out of range.")
+    reconnect_parser.add_argument("--radio-latency", type=float, default=0.01, help="Fake BLE latency in seconds.")
+    reconnect_parser.add_argument("--answer-delay", type=float, default=0.3, help="Seconds the fake player takes to answer.")
+
+    rtt_parser = subparsers.add_parser("rtt", help="Round trip of color writes and answers, matched per write, on several boards.")
+    rtt_parser.add_argument("--boards", type=int, default=8)
+    rtt_parser.add_argument("--radio-latency", type=float, default=0.01, help="Fake BLE latency in seconds.")
+    rtt_parser.add_argument("--jitter", type=float, default=0.02, help="Extra fake BLE latency of up to this many seconds.")
+    rtt_parser.add_argument("--answer-delay", type=float, default=0.3, help="Median seconds the fake player takes to answer.")
+    rtt_parser.add_argument("--reaction-sigma", type=float, default=0.5, help="Spread of the fake player's answer times.")
+
+    discovery_parser = subparsers.add_parser("discovery", help="Finding the characteristics on connections and reconnects.")
+    discovery_parser.add_argument("--connections", type=int, default=1000)
+
+    metrics_parser = subparsers.add_parser("metrics", help="Decoding text metrics vs binary metric frames.")
+    metrics_parser.add_argument("--samples", type=int, default=100000)
+    metrics_parser.add_argument("--samples-per-frame", type=int, default=4, help="Four samples fit the firmware's 50 byte characteristic.")
+
+    scrape_parser = subparsers.add_parser("scrape", help="Render time and scrape latency of the metrics endpoint.")
+    scrape_parser.add_argument("--boards", type=int, default=50)
+    scrape_parser.add_argument("--samples", type=int, default=100000, help="Latencies recorded per histogram.")
+    scrape_parser.add_argument("--scrapes", type=int, default=200)
+
+    frontend_parser = subparsers.add_parser("frontend", help="Host frontend throughput per window, per clip and batched.")
+    frontend_parser.add_argument("--clips", type=int, default=1000)
+
+    conformance_parser = subparsers.add_parser("conformance", help="Fixed point host frontend against the golden vectors.")
+    conformance_parser.add_argument("--golden", default=os.path.join(AUDIO_DATA_DIR, "golden_features.json"))
+
+    model_parser = subparsers.add_parser("model", help="Host model interpreter throughput per input and batched.")
+    model_parser.add_argument("--clips", type=int, default=1000)
+
+    histograms_parser = subparsers.add_parser("histograms", help="Latency histograms vs keeping every sample.")
+    histograms_parser.add_argument("--samples", type=int, default=100000)
+    histograms_parser.add_argument("--answer-time", type=float, default=0.8, help="Median latency in seconds.")
+
+    args = parser.parse_args()
+    if args.benchmark == "batched":
+        asyncio.run(bench_batched(args.latency, args.colors, args.repeats))
+    elif args.benchmark == "fanout":
+        asyncio.run(bench_fanout(args.latency, args.colors, args.concurrency, args.invalid_rate))
+    elif args.benchmark == "stream":
+        asyncio.run(bench_stream(args.latency, args.chunk_interval, args.colors))
+    elif args.benchmark == "sources":
+        asyncio.run(bench_sources(args.latency, args.colors, args.repeats))
+    elif args.benchmark == "async-client":
+        bench_async_client(args.latency, args.connect_latency, args.requests)
+    elif args.benchmark == "hedge":
+        if not asyncio.run(bench_hedge(args.latency, args.sigma, args.requests, args.wave_size, args.hedge_percentile, args.deadline)):
+            sys.exit(1)
+    elif args.benchmark == "pool":
+        asyncio.run(bench_pool(args.latency, args.colors, args.games))
+    elif args.benchmark == "startup":
+        bench_startup(args.runs)
+    elif args.benchmark == "commands":
+        asyncio.run(bench_commands(args.commands, args.radio_latency))
+    elif args.benchmark == "loop-lag":
+        if not asyncio.run(bench_loop_lag(args.intro, args.latency, args.radio_latency, args.answer_delay, args.max_lag)):
+            sys.exit(1)
+    elif args.benchmark == "reconnect":
+        asyncio.run(bench_reconnect(args.drop_round, args.downtime, args.radio_latency, args.answer_delay))
+    elif args.benchmark == "rtt":
+        asyncio.run(bench_rtt(args.boards, args.radio_latency, args.jitter, args.answer_delay, args.reaction_sigma))
+    elif args.benchmark == "scrape":
+        asyncio.run(bench_scrape(args.boards, args.samples, args.scrapes))
+    elif args.benchmark == "frontend":
+        bench_frontend(args.clips)
+    elif args.benchmark == "conformance":
+        if not check_conformance(args.golden):
+            sys.exit(1)
+    elif args.benchmark == "model":
+        bench_model(args.clips)
+    elif args.benchmark == "histograms":
+        bench_histograms(args.samples, args.answer_time)
+    elif args.benchmark == "discovery":
+        asyncio.run(bench_discovery(args.connections))
+    elif args.benchmark == "metrics":
+        bench_metrics(args.samples, args.samples_per_frame)
+    elif args.benchmark == "scan":
+        asyncio.run(bench_scan(args.boards, args.discover_timeout, args.connect_latency))
+    elif args.benchmark == "sessions":
+        if args.boards > args.adapters * args.max_connections:
+            parser.error("every board needs a connection slot, so use more adapters or connections")
+        if not asyncio.run(bench_sessions(args.boards, args.adapters, args.max_connections, args.latency, args.radio_latency,
+                                          args.answer_delay, args.timeout)):
+            sys.exit(1)
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+
+from color_sources import GAME_COLORS, ColorSource
+
+
+# Default location and limits of the on-disk pool of color sequences.
+COLOR_POOL_PATH = "color_pool.sqlite3"
+# Table of the sequences from Gemini. Other sources keep theirs in a table of their own in the same
+# file, so a run against a stand-in never has its colors served as Gemini's.
+COLOR_POOL_TABLE = "color_sequences"
+FAKE_COLOR_POOL_TABLE = "fake_color_sequences"
+COLOR_POOL_SIZE = 50
+COLOR_POOL_MAX_AGE = 7 * 24 * 60 * 60
+# Seconds between refill requests, and after a failed one, so refilling stays in the background.
+COLOR_POOL_REFILL_INTERVAL = 2.0
+COLOR_POOL_RETRY_INTERVAL = 30.0
+
+
+# Color source that serves color sequences from a SQLite pool on disk, so a game can start instantly
+# even right after a restart or while the wrapped source is unavailable. Sequences are used once,
+# oldest first. The pool holds at most capacity sequences and drops any older than max_age seconds.
+# A low-priority refill task tops the pool up from the wrapped source whenever no game is waiting on it.
+# Every commit is an fsync, so the asynchronous methods run the pool I/O in worker threads and the
+# event loop keeps serving BLE notifications meanwhile.
+class PooledColorSource(ColorSource):
+    def __init__(self, source, sequence_length, path=COLOR_POOL_PATH, capacity=COLOR_POOL_SIZE, max_age=COLOR_POOL_MAX_AGE,
+                 refill_interval=COLOR_POOL_REFILL_INTERVAL, table=COLOR_POOL_TABLE):
+        self.source = source
+        self.table = table
+        self.sequence_length = sequence_length
+        self.capacity = capacity
+        self.max_age = max_age
+        self.refill_interval = refill_interval
+        self.hits = 0
+        self.misses = 0
+
+        # Number of requests a game is waiting on. The refill task only runs while this is zero.
+        self.foreground_requests = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+        # The connection is shared by the worker threads, one operation at a time.
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, colors TEXT NOT NULL, length INTEGER NOT NULL, created_at REAL NOT NULL)")
+        self.connection.commit()
+        self.evict()
+
+    # Method for dropping sequences past the maximum age and the oldest ones over capacity. Blocks, like
+    # the other pool methods, so call it from a worker thread once the event loop runs.
+    def evict(self):
+        with self.lock:
+            self.connection.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.max_age,))
+            self.connection.execute(
+                f"DELETE FROM {self.table} WHERE id NOT IN (SELECT id FROM {self.table} ORDER BY created_at DESC LIMIT ?)",
+                (self.capacity,))
+            self.connection.commit()
+
+    # Method for the number of sequences of the given length in the pool.
+    def size(self, length=None):
+        length = self.sequence_length if length is None else length
+        with self.lock:
+            return self.connection.execute(f"SELECT COUNT(*) FROM {self.table} WHERE length = ?", (length,)).fetchone()[0]
+
+    # Method for adding a validated sequence to the pool.
+    def add(self, colors):
+        if len(colors) != self.sequence_length or any(color not in GAME_COLORS for color in colors):
+            return
+        with self.lock:
+            self.connection.execute(f"INSERT INTO {self.table} (colors, length, created_at) VALUES (?, ?, ?)",
+                                    (json.dumps(colors), len(colors), time.time()))
+            self.connection.commit()
+            self.evict()
+
+    # Method for taking the oldest usable sequence of the given length out of the pool, or None.
+    def take(self, length):
+        while True:
+            with self.lock:
+                row = self.connection.execute(
+                    f"SELECT id, colors FROM {self.table} WHERE length = ? AND created_at >= ? ORDER BY created_at LIMIT 1",
+                    (length, time.time() - self.max_age)).fetchone()
+                if row is None:
+                    return None
+                self.connection.execute(f"DELETE FROM {self.table} WHERE id = ?", (row[0],))
+                self.connection.commit()
+
+            # Skip anything that does not decode to a valid sequence, e.g. after a hand edit of the file.
+            try:
+                colors = json.loads(row[1])
+            except ValueError:
+                continue
+            if isinstance(colors, list) and len(colors) == length and all(color in GAME_COLORS for color in colors):
+                return colors
+
+    # Methods for marking a game waiting on the wrapped source, which pauses the refill task.
+    def pause_refill(self):
+        self.foreground_requests += 1
+        self.idle.clear()
+
+    def resume_refill(self):
+        self.foreground_requests -= 1
+        if self.foreground_requests == 0:
+            self.idle.set()
+
+    async def next_colors(self, num_colors):
+        colors = await asyncio.to_thread(self.take, num_colors)
+        if colors is not None:
+            self.hits += 1
+            return colors
+
+        self.misses += 1
+        self.pause_refill()
+        try:
+            return await self.source.next_colors(num_colors)
+        finally:
+            self.resume_refill()
+
+    async def stream_colors(self, num_colors):
+        colors = await asyncio.to_thread(self.take, num_colors)
+        if colors is not None:
+            self.hits += 1
+            for color in colors:
+                yield color
+            return
+
+        self.misses += 1
+        self.pause_refill()
+        try:
+            async for color in self.source.stream_colors(num_colors):
+                yield color
+        finally:
+            self.resume_refill()
+
+    async def warm_up(self):
+        await self.source.warm_up()
+
+    # Asynchronous method for keeping the pool full. Runs until cancelled. Only one request is made
+    # at a time, never while a game is waiting on the wrapped source, and with a pause after each.
+    async def refill(self):
+        while True:
+            await self.idle.wait()
+            if await asyncio.to_thread(self.size) >= self.capacity:
+                await asyncio.sleep(self.refill_interval)
+                continue
+
+            try:
+                colors = await self.source.generate_pool_colors(self.sequence_length)
+            except Exception as e:
+                print(f"Error refilling the color pool: {e}")
+                colors = None
+
+            if colors is None:
+                await asyncio.sleep(COLOR_POOL_RETRY_INTERVAL)
+                continue
+            await asyncio.to_thread(self.add, colors)
+            await asyncio.sleep(self.refill_interval)
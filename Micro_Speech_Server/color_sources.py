@@ -0,0 +1,466 @@
+import asyncio
+from collections import deque
+import json
+import math
+import random
+import re
+import time
+
+from histograms import latencies
+
+
+# Game colors in the order of their Gemini number (1, 2, 3) and color byte sent to the Arduino.
+GAME_COLORS = ["green", "red", "blue"]
+
+# Ask Gemini for the whole color sequence in one request instead of one request per round.
+GEMINI_BATCHED = True
+# Number of per-color Gemini requests allowed in flight at once, and extra requests allowed to
+# replace invalid answers before the fallback source picks the missing colors.
+GEMINI_MAX_CONCURRENCY = 4
+GEMINI_SPARE_REQUESTS = 2
+# A request that has not answered by this percentile of recent request latencies gets a duplicate
+# (hedge) request, and the first valid answer wins. Until enough latencies have been seen the
+# initial hedge delay in seconds is used. A hedge_percentile of None turns hedging off.
+GEMINI_HEDGE_PERCENTILE = 0.9
+GEMINI_INITIAL_HEDGE_DELAY = 1.0
+GEMINI_HEDGE_MIN_SAMPLES = 10
+# Seconds a request (including its hedge) may take before the local fallback source picks instead.
+GEMINI_DEADLINE = 5.0
+
+# Pattern for complete items in a streamed JSON array: quoted strings, or bare numbers followed by a delimiter.
+COLOR_ITEM_PATTERN = re.compile(r'"([^"]*)"|(\d+)(?=[,\]\s])')
+
+
+# Method for turning a single Gemini answer into a game color. Returns None for anything invalid.
+def parse_gemini_color(answer):
+    answer = str(answer).strip().strip('"').lower()
+
+    # Doing numbers instead of colors to prevent model bias.
+    if answer in ("1", "2", "3"):
+        return GAME_COLORS[int(answer) - 1]
+    if answer in GAME_COLORS:
+        return answer
+    return None
+
+# Method for parsing a whole color sequence answer. Returns None if it is not a JSON array, otherwise
+# exactly num_colors colors with None for invalid or missing entries.
+def parse_gemini_color_sequence(text, num_colors):
+    try:
+        answers = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(answers, list):
+        return None
+
+    colors = [parse_gemini_color(answer) for answer in answers[:num_colors]]
+    colors += [None] * (num_colors - len(colors))
+    return colors
+
+# Method for the nearest-rank percentile of a list of numbers, with fraction between 0 and 1.
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+# Method for building the Gemini request for a whole color sequence. The response is constrained
+# to a JSON array of exactly num_colors items, each "1", "2" or "3". Generation configs are plain
+# dicts, which the library accepts, so this module does not need to import it.
+def color_sequence_request(num_colors):
+    prompt_parts = [f"Respond only with a JSON array of {num_colors} items, each 1, 2, or 3. Pick each one randomly."]
+    generation_config = {
+        "temperature": 0.9,
+        "top_p": 0.75,
+        "response_mime_type": "application/json",
+        "response_schema": {
+            "type": "array",
+            "items": {"type": "string", "format": "enum", "enum": ["1", "2", "3"]},
+            "min_items": num_colors,
+            "max_items": num_colors,
+        },
+    }
+    return prompt_parts, generation_config
+
+
+# Base class for everything that can pick the colors of a game.
+class ColorSource:
+    # Asynchronous method for getting a list of num_colors game colors.
+    async def next_colors(self, num_colors):
+        raise NotImplementedError
+
+    # Asynchronous generator for the same colors, one at a time. Sources that can deliver colors
+    # before the whole list is ready override this.
+    async def stream_colors(self, num_colors):
+        for color in await self.next_colors(num_colors):
+            yield color
+
+    # Asynchronous method for setting up connections ahead of the first request. Nothing to do by default.
+    async def warm_up(self):
+        pass
+
+    # Asynchronous method for a sequence worth keeping in the color pool, or None if there is none.
+    # Unlike next_colors this must not fill in colors from a fallback.
+    async def generate_pool_colors(self, num_colors):
+        return await self.next_colors(num_colors)
+
+
+# Color source that picks colors locally with a seeded random number generator. Never waits.
+class RandomColorSource(ColorSource):
+    def __init__(self, seed=None):
+        self.random = random.Random(seed)
+
+    async def next_colors(self, num_colors):
+        return [self.random.choice(GAME_COLORS) for _ in range(num_colors)]
+
+
+# Color source that asks a Gemini model for the colors. All requests use the library's async client,
+# which keeps one long-lived gRPC channel for the whole process instead of a worker thread per request.
+# Slow requests are hedged, and requests past the deadline are answered by the fallback source.
+# Instead of a model, a load_model function can be given. It runs in a worker thread on first use,
+# so importing and configuring the Gemini library does not hold up startup.
+class GeminiColorSource(ColorSource):
+    def __init__(self, model=None, batched=GEMINI_BATCHED, max_concurrency=GEMINI_MAX_CONCURRENCY, spare_requests=GEMINI_SPARE_REQUESTS,
+                 hedge_percentile=GEMINI_HEDGE_PERCENTILE, deadline=GEMINI_DEADLINE, fallback=None, load_model=None):
+        self.model = model
+        self.load_model = load_model
+        self.loading = None
+        self.batched = batched
+        self.max_concurrency = max_concurrency
+        self.spare_requests = spare_requests
+        self.hedge_percentile = hedge_percentile
+        self.deadline = deadline
+        self.fallback = fallback if fallback is not None else RandomColorSource()
+
+        # Recent latencies of single attempts per kind of request, used for the hedge delay, and the
+        # latencies of whole requests including hedges, used for reporting. An attempt that lost to its
+        # hedge or failed counts with the time it took until then, a lower bound on its latency, as
+        # leaving the slow attempts out would pull the hedge delay below the percentile.
+        self.attempt_latencies = {"color": deque(maxlen=200), "sequence": deque(maxlen=200)}
+        self.request_latencies = []
+        self.requests = 0
+        self.hedges = 0
+        self.deadline_fallbacks = 0
+
+    # Asynchronous method for the model, loading it in a worker thread the first time.
+    async def get_model(self):
+        if self.model is None:
+            if self.loading is None:
+                self.loading = asyncio.create_task(asyncio.to_thread(self.load_model))
+            # Shielded, so a request given up on at its deadline does not cancel the shared load.
+            self.model = await asyncio.shield(self.loading)
+        return self.model
+
+    # Asynchronous method for loading the model and opening the gRPC channel (DNS, TLS and HTTP/2
+    # handshakes) with a cheap token count request, so the first color request does not pay for it.
+    async def warm_up(self):
+        start_time = time.time()
+        try:
+            model = await self.get_model()
+            await model.count_tokens_async("Warm up.")
+        except Exception as e:
+            print(f"Error warming up Gemini: {e}")
+            return
+        print(f"Gemini channel warm-up latency: {time.time() - start_time:.4f} seconds")
+
+    # Method for the seconds to wait before hedging a request of the given kind.
+    def hedge_delay(self, kind):
+        latencies = self.attempt_latencies[kind]
+        if len(latencies) < GEMINI_HEDGE_MIN_SAMPLES:
+            return GEMINI_INITIAL_HEDGE_DELAY
+        return percentile(latencies, self.hedge_percentile)
+
+    # Asynchronous method for a single Gemini attempt, recording its latency however it ends.
+    async def attempt(self, kind, prompt_parts, generation_config):
+        start_time = time.time()
+        try:
+            model = await self.get_model()
+            response = await model.generate_content_async(prompt_parts, generation_config=generation_config)
+            return response.text
+        finally:
+            self.attempt_latencies[kind].append(time.time() - start_time)
+
+    # Asynchronous method for a hedged Gemini request. The parse method turns the answer text into a
+    # result, or None if the answer is invalid. If no valid answer has arrived by the hedge delay (or
+    # the first attempt failed early), one duplicate request is sent and the first valid answer wins.
+    # Returns None if there is no valid answer before the deadline.
+    async def request(self, kind, prompt_parts, generation_config, parse):
+        start_time = time.time()
+        deadline = start_time + self.deadline
+        hedge_time = start_time + self.hedge_delay(kind) if self.hedge_percentile is not None else None
+        tasks = {asyncio.create_task(self.attempt(kind, prompt_parts, generation_config))}
+        result = None
+        self.requests += 1
+        try:
+            while result is None and time.time() < deadline:
+                wait_until = deadline if hedge_time is None else min(deadline, hedge_time)
+                done, tasks = await asyncio.wait(tasks, timeout=max(0.0, wait_until - time.time()), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        print(f"Error getting answer from Gemini: {task.exception()}")
+                    elif result is None:
+                        result = parse(task.result())
+
+                # Hedge once the delay has passed, or right away if every attempt so far has failed.
+                if result is None and hedge_time is not None and (not tasks or time.time() >= hedge_time):
+                    self.hedges += 1
+                    hedge_time = None
+                    tasks.add(asyncio.create_task(self.attempt(kind, prompt_parts, generation_config)))
+                elif not tasks:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if result is None and time.time() >= deadline:
+            print(f"Gemini did not answer within {self.deadline} seconds. Using the fallback color source.")
+            self.deadline_fallbacks += 1
+        self.request_latencies.append(time.time() - start_time)
+        latencies.record("gemini_request", time.time() - start_time)
+        return result
+
+    # Method for the p50 and p99 request latency in seconds, and the share of requests that were hedged.
+    def latency_summary(self):
+        hedge_rate = self.hedges / self.requests if self.requests else 0.0
+        return percentile(self.request_latencies, 0.5), percentile(self.request_latencies, 0.99), hedge_rate
+
+    # Asynchronous method for getting a color from Gemini. Returns None if there is no valid answer
+    # before the deadline, so the caller can ask again or fill the gap.
+    async def get_color(self):
+        prompt_parts = ["Respond only with 1, 2, or 3. Pick one randomly."]
+        generation_config = {
+            "temperature": 0.9,
+            "top_p": 0.75,
+        }
+        start_time = time.time()  # Record start time before calling Gemini
+        color = await self.request("color", prompt_parts, generation_config, parse_gemini_color)
+        end_time = time.time()  # Record end time after receiving response
+        latency = end_time - start_time
+        print(f"Gemini color response latency: {latency:.4f} seconds")
+        return color
+
+    # Asynchronous method for getting a whole color sequence from Gemini in a single request.
+    # Invalid or missing entries are returned as None so the caller can repair them. If there is no
+    # usable answer at all the fallback source picks the whole sequence.
+    async def get_color_sequence(self, num_colors):
+        prompt_parts, generation_config = color_sequence_request(num_colors)
+        start_time = time.time()
+        colors = await self.request("sequence", prompt_parts, generation_config,
+                                    lambda text: parse_gemini_color_sequence(text, num_colors))
+        end_time = time.time()
+        print(f"Gemini color sequence latency: {end_time - start_time:.4f} seconds")
+
+        if colors is None:
+            colors = await self.fallback.next_colors(num_colors)
+        return colors
+
+    # Asynchronous method for asking Gemini for colors with one request per color, keeping up to
+    # max_concurrency requests in flight. Each invalid answer is asked again, up to spare_requests
+    # times in all, and the fallback source picks whatever is still missing at the end. Colors are
+    # returned in the order their requests were made.
+    async def next_colors_concurrently(self, num_colors, spare_requests=None):
+        if spare_requests is None:
+            spare_requests = self.spare_requests
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = []
+        latencies = []
+
+        async def request_color(index):
+            async with semaphore:
+                request_start_time = time.time()
+                try:
+                    results[index] = await self.get_color()
+                except Exception as e:
+                    print(f"Error getting color from Gemini: {e}")
+                latencies.append(time.time() - request_start_time)
+            return results[index]
+
+        def start_request():
+            results.append(None)
+            return asyncio.create_task(request_color(len(results) - 1))
+
+        start_time = time.time()
+        tasks = {start_request() for _ in range(num_colors)}
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.result() is None and spare_requests > 0:
+                    spare_requests -= 1
+                    tasks.add(start_request())
+        wall_clock = time.time() - start_time
+        print(f"Gemini fan-out: {len(latencies)} requests in {wall_clock:.4f} seconds wall-clock, "
+              f"{sum(latencies):.4f} seconds sum of latencies")
+
+        colors = [color for color in results if color]
+        if len(colors) < num_colors:
+            print(f"Warning: Could not get {num_colors - len(colors)} valid colors from Gemini. Picking them locally.")
+            colors += await self.fallback.next_colors(num_colors - len(colors))
+        return colors
+
+    # Asynchronous method for asking Gemini for a list of colors.
+    async def next_colors(self, num_colors):
+        if not self.batched:
+            return await self.next_colors_concurrently(num_colors)
+
+        colors = await self.get_color_sequence(num_colors)
+
+        # Only fall back to one request per color for the slots the batch could not fill.
+        missing = [i for i, color in enumerate(colors) if color is None]
+        if missing:
+            print(f"Gemini sequence had {len(missing)} invalid colors. Asking for them one by one.")
+            for i, color in zip(missing, await self.next_colors_concurrently(len(missing), spare_requests=0)):
+                colors[i] = color
+        return colors
+
+    # Asynchronous method for a sequence where every color came from Gemini, or None.
+    async def generate_pool_colors(self, num_colors):
+        prompt_parts, generation_config = color_sequence_request(num_colors)
+        colors = await self.request("sequence", prompt_parts, generation_config,
+                                    lambda text: parse_gemini_color_sequence(text, num_colors))
+        if colors is None or None in colors:
+            return None
+        return colors
+
+    # Asynchronous generator for streaming a color sequence from Gemini. Each color is yielded as soon
+    # as its item in the JSON array is complete, so the first round can start on the first token.
+    # The time to first token and the whole stream must fit in the deadline, after which the fallback
+    # source picks the remaining colors. Invalid items are skipped and any colors a finished stream
+    # did not deliver are requested one by one.
+    async def stream_colors(self, num_colors):
+        prompt_parts, generation_config = color_sequence_request(num_colors)
+        start_time = time.time()
+        deadline = start_time + self.deadline
+        count = 0
+        text = ""
+        parsed = 0
+        expired = False
+        try:
+            model = await asyncio.wait_for(self.get_model(), max(0.0, deadline - time.time()))
+            response = await asyncio.wait_for(model.generate_content_async(prompt_parts, generation_config=generation_config, stream=True),
+                                              max(0.0, deadline - time.time()))
+            chunks = aiter(response)
+            while count < num_colors:
+                try:
+                    chunk = await asyncio.wait_for(anext(chunks), max(0.0, deadline - time.time()))
+                except StopAsyncIteration:
+                    break
+                text += chunk.text
+                for match in COLOR_ITEM_PATTERN.finditer(text, parsed):
+                    parsed = match.end()
+                    color = parse_gemini_color(match.group(1) or match.group(2))
+                    if color is not None and count < num_colors:
+                        if count == 0:
+                            print(f"Gemini first color latency: {time.time() - start_time:.4f} seconds")
+                        count += 1
+                        yield color
+        except asyncio.TimeoutError:
+            expired = True
+        except Exception as e:
+            print(f"Error streaming colors from Gemini: {e}")
+        print(f"Gemini color stream latency: {time.time() - start_time:.4f} seconds")
+
+        if count < num_colors:
+            if expired:
+                print(f"Gemini did not stream the colors within {self.deadline} seconds. Using the fallback color source.")
+                self.deadline_fallbacks += 1
+                colors = await self.fallback.next_colors(num_colors - count)
+            else:
+                print(f"Gemini stream had {num_colors - count} invalid colors. Asking for them one by one.")
+                colors = await self.next_colors_concurrently(num_colors - count, spare_requests=0)
+            for color in colors:
+                yield color
+
+
+# Stand-in for the Gemini response object. Only the text is used by the server.
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+# Stand-in for a streamed Gemini response. The first chunk arrives after the time to first token
+# and every following chunk after chunk_interval.
+class FakeStreamResponse:
+    def __init__(self, chunks, latency, chunk_interval):
+        self.chunks = chunks
+        self.latency = latency
+        self.chunk_interval = chunk_interval
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.latency)
+        for i, chunk in enumerate(self.chunks):
+            if i > 0:
+                await asyncio.sleep(self.chunk_interval)
+            yield FakeResponse(chunk)
+
+# Local stand-in for the Gemini service behind google.generativeai.GenerativeModel, for load tests and benchmarks
+# without a network or API key. Every request waits for a latency drawn from the configured
+# distribution around the median latency:
+#   "fixed"       always the median latency
+#   "uniform"     uniform between 0 and twice the median
+#   "exponential" exponential with the same median
+#   "lognormal"   log-normal with the given sigma, which gives the long tail of a real service
+# The first request also pays connect_latency, like opening the gRPC channel of the real client.
+# Single color prompts are answered with "1", "2" or "3" and JSON prompts with a JSON array.
+# A fraction of single color answers can be made invalid to exercise the retry paths.
+class FakeGenerativeModel:
+    def __init__(self, latency=0.5, distribution="fixed", sigma=0.5, seed=None, invalid_rate=0.0, chunk_interval=0.01, connect_latency=0.0):
+        self.latency = latency
+        self.distribution = distribution
+        self.sigma = sigma
+        self.random = random.Random(seed)
+        self.invalid_rate = invalid_rate
+        self.chunk_interval = chunk_interval
+        self.connect_latency = connect_latency
+        self.connected = False
+        self.calls = 0
+
+    def sample_latency(self):
+        connect_latency = 0.0 if self.connected else self.connect_latency
+        self.connected = True
+        return connect_latency + self.base_latency()
+
+    def base_latency(self):
+        if self.distribution == "fixed":
+            return self.latency
+        if self.distribution == "uniform":
+            return self.random.uniform(0, 2 * self.latency)
+        if self.distribution == "exponential":
+            return self.random.expovariate(math.log(2) / self.latency)
+        if self.distribution == "lognormal":
+            return self.random.lognormvariate(math.log(self.latency), self.sigma)
+        raise ValueError(f"Unknown latency distribution '{self.distribution}'")
+
+    def answer(self, prompt_parts, generation_config):
+        self.calls += 1
+        if generation_config is not None and generation_config.get("response_mime_type") == "application/json":
+            count = int(re.search(r"JSON array of (\d+)", prompt_parts[0]).group(1))
+            return json.dumps([str(self.random.randint(1, 3)) for _ in range(count)])
+        if self.random.random() < self.invalid_rate:
+            return "I pick two."
+        return str(self.random.randint(1, 3))
+
+    # Split the text into chunks of a few characters, like tokens. A full response takes as long
+    # as receiving every chunk of the streamed one.
+    def chunk(self, text):
+        chunks = [text[i:i + 6] for i in range(0, len(text), 6)]
+        latency = self.sample_latency()
+        return chunks, latency, latency + self.chunk_interval * (len(chunks) - 1)
+
+    def generate_content(self, prompt_parts, generation_config=None):
+        text = self.answer(prompt_parts, generation_config)
+        time.sleep(self.chunk(text)[2])
+        return FakeResponse(text)
+
+    async def generate_content_async(self, prompt_parts, generation_config=None, stream=False):
+        text = self.answer(prompt_parts, generation_config)
+        chunks, latency, duration = self.chunk(text)
+        if stream:
+            return FakeStreamResponse(chunks, latency, self.chunk_interval)
+        await asyncio.sleep(duration)
+        return FakeResponse(text)
+
+    async def count_tokens_async(self, contents):
+        await asyncio.sleep(self.sample_latency())
+
+# Color source that runs the Gemini code paths against the local FakeGenerativeModel stand-in.
+class FakeGeminiColorSource(GeminiColorSource):
+    def __init__(self, latency=0.5, distribution="lognormal", sigma=0.5, seed=None, invalid_rate=0.0, **kwargs):
+        super().__init__(FakeGenerativeModel(latency, distribution, sigma, seed, invalid_rate), **kwargs)
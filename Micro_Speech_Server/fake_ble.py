@@ -0,0 +1,320 @@
+import asyncio
+import inspect
+import random
+import time
+
+from metric_frames import encode_metric_frame
+
+
+# GATT table of the Nano33BLE firmware in micro_speech_BLE/arduino_command_responder.cpp.
+NANO33BLE_NAME = "Nano33BLE"
+NANO33BLE_SERVICE_UUID = "0000180d-0000-1000-8000-00805f9b34fb"
+NANO33BLE_SPEECH_UUID = "00002a37-0000-1000-8000-00805f9b34fb"
+NANO33BLE_COLOR_UUID = "f0001111-0451-4000-b000-000000000000"
+NANO33BLE_METRICS_UUID = "f0002222-0451-4000-b000-000000000000"
+
+
+# Stand-in for a bleak GATT characteristic.
+class FakeCharacteristic:
+    def __init__(self, uuid, properties, description="Fake characteristic"):
+        self.uuid = uuid
+        self.properties = properties
+        self.description = description
+        self.handle = None
+
+
+# Stand-in for a bleak GATT service.
+class FakeService:
+    def __init__(self, uuid, characteristics, description="Fake service"):
+        self.uuid = uuid
+        self.characteristics = characteristics
+        self.description = description
+        self.handle = None
+
+
+# Stand-in for bleak's BleakGATTServiceCollection. Hands out attribute handles the way a GATT server
+# lays out its table: one for each service, two for each characteristic and one more for the client
+# configuration descriptor of those that notify.
+class FakeServiceCollection:
+    def __init__(self, services, first_handle=1):
+        self.services = {}
+        self.characteristics = {}
+        handle = first_handle
+        for service in services:
+            service.handle = handle
+            self.services[handle] = service
+            handle += 1
+            for char in service.characteristics:
+                char.handle = handle
+                self.characteristics[handle] = char
+                handle += 3 if "notify" in char.properties else 2
+
+    def __iter__(self):
+        return iter(self.services.values())
+
+    def get_characteristic(self, specifier):
+        if isinstance(specifier, int):
+            return self.characteristics.get(specifier)
+        return next((char for char in self.characteristics.values() if char.uuid == specifier), None)
+
+
+# Stand-in for the BLEDevice objects a scan returns. The device starts advertising advertising_delay
+# seconds after a scan starts and repeats its advertisement every advertising_interval seconds.
+class FakeDevice:
+    def __init__(self, name, address, service_uuids=(), advertising_delay=0.0, advertising_interval=0.1):
+        self.name = name
+        self.address = address
+        self.service_uuids = list(service_uuids)
+        self.advertising_delay = advertising_delay
+        self.advertising_interval = advertising_interval
+
+
+# Stand-in for bleak's AdvertisementData.
+class FakeAdvertisementData:
+    def __init__(self, local_name, service_uuids):
+        self.local_name = local_name
+        self.service_uuids = service_uuids
+
+
+# Stand-in for BleakScanner over a fixed list of devices. Detection callbacks get every advertisement
+# while the scanner runs, and discover waits out the whole timeout like bleak's does.
+class FakeBleakScanner:
+    def __init__(self, devices, detection_callback=None, **kwargs):
+        self.devices = devices
+        self.detection_callback = detection_callback
+        self.timers = []
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.timers = [loop.call_later(device.advertising_delay, self.advertise, device) for device in self.devices]
+
+    async def stop(self):
+        for timer in self.timers:
+            timer.cancel()
+        self.timers = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    # Method for one advertisement of a device, which schedules the next one.
+    def advertise(self, device):
+        if self.detection_callback is not None:
+            self.detection_callback(device, FakeAdvertisementData(device.name, device.service_uuids))
+        self.timers.append(asyncio.get_running_loop().call_later(device.advertising_interval, self.advertise, device))
+
+    async def discover(self, timeout=5.0, **kwargs):
+        await asyncio.sleep(timeout)
+        return [device for device in self.devices if device.advertising_delay <= timeout]
+
+
+# In-process stand-in for BleakClient, for benchmarks and tests without Bluetooth. The peripheral
+# side calls peripheral_write to change a characteristic value the way the firmware's writeValue
+# does, which notifies a subscribed server, and peripheral_disconnect to drop the link. Every read,
+# write and notification takes radio_latency plus up to jitter seconds, and notifications keep their
+# order. Values survive reconnects, subscriptions do not. write_handlers maps a characteristic UUID to
+# a function the peripheral runs with each value the server writes to it.
+class FakeBleakClient:
+    def __init__(self, address, radio_latency=0.0, services=(), disconnected_callback=None, jitter=0.0, seed=None):
+        self.address = address
+        self.radio_latency = radio_latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.services = FakeServiceCollection(services)
+        self.disconnected_callback = disconnected_callback
+        self.adapter = None
+        self.is_connected = False
+        self.values = {}
+        self.callbacks = {}
+        self.write_handlers = {}
+        self.last_delivery = 0.0
+        # Event loop time until which the peripheral is out of range after a dropped link.
+        self.unavailable_until = 0.0
+
+    # Method for the time one radio transfer takes.
+    def latency(self):
+        return self.radio_latency + self.random.uniform(0.0, self.jitter)
+
+    async def connect(self, adapter=None):
+        await asyncio.sleep(self.latency())
+        if asyncio.get_running_loop().time() < self.unavailable_until:
+            raise ConnectionError(f"Device with address {self.address} was not found.")
+        self.adapter = adapter
+        self.is_connected = True
+
+    async def disconnect(self):
+        self.drop()
+
+    async def __aenter__(self):
+        await self.connect(self.adapter)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.disconnect()
+
+    # Method for ending the connection, which bleak reports to the disconnected callback.
+    def drop(self):
+        if not self.is_connected:
+            return
+        self.is_connected = False
+        self.callbacks.clear()
+        if self.disconnected_callback is not None:
+            self.disconnected_callback(self)
+
+    def check_connected(self):
+        if not self.is_connected:
+            raise ConnectionError("Not connected")
+
+    async def start_notify(self, characteristic, callback):
+        self.check_connected()
+        self.callbacks[getattr(characteristic, "uuid", characteristic)] = (characteristic, callback)
+
+    async def stop_notify(self, characteristic):
+        self.callbacks.pop(getattr(characteristic, "uuid", characteristic), None)
+
+    async def read_gatt_char(self, characteristic):
+        self.check_connected()
+        await asyncio.sleep(self.latency())
+        self.check_connected()
+        return bytearray(self.values.get(getattr(characteristic, "uuid", characteristic), b""))
+
+    async def write_gatt_char(self, characteristic, data, response=False):
+        self.check_connected()
+        await asyncio.sleep(self.latency())
+        self.check_connected()
+        uuid = getattr(characteristic, "uuid", characteristic)
+        self.values[uuid] = bytes(data)
+        if uuid in self.write_handlers:
+            self.write_handlers[uuid](bytes(data))
+
+    # Method for the peripheral changing a value. Subscribers get a notification after the radio latency,
+    # in the order the values were written. The event loop does not keep that order for timers due at
+    # the same time, so each notification is due a microsecond after the one before it at the least.
+    def peripheral_write(self, uuid, value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        self.values[uuid] = value
+        if uuid in self.callbacks:
+            loop = asyncio.get_running_loop()
+            self.last_delivery = max(loop.time() + self.latency(), self.last_delivery + 1e-6)
+            loop.call_at(self.last_delivery, self.deliver, uuid, value)
+
+    # Method for the link dropping, e.g. the board going out of range, for downtime seconds.
+    def peripheral_disconnect(self, downtime=0.0):
+        self.unavailable_until = asyncio.get_running_loop().time() + downtime
+        self.drop()
+
+    # Bleak runs coroutine callbacks as tasks, so do the same.
+    def deliver(self, uuid, value):
+        if uuid not in self.callbacks:
+            return
+        characteristic, callback = self.callbacks[uuid]
+        result = callback(characteristic, bytearray(value))
+        if inspect.isawaitable(result):
+            asyncio.ensure_future(result)
+
+
+# Emulation of the Nano33BLE firmware in micro_speech_BLE/arduino_command_responder.cpp on a fake BLE
+# link. The board starts BLE advertising_delay seconds after start(), the way the firmware does when it
+# first hears "yes", then advertises as Nano33BLE with the speech service and writes "Command: PlayGame"
+# play_game_writes times, once per inference loop. Its player answers every color written to the board
+# after a lognormal reaction time around answer_delay, with the right word at the given accuracy. Each
+# answer is sent like the firmware does: a wake_latency metric, the word, then a ble_write_latency metric.
+# With binary_metrics the two metrics go out together after the word as one binary metric frame.
+class FakeNano33BLE:
+    def __init__(self, address, name=NANO33BLE_NAME, radio_latency=0.01, jitter=0.0, answer_delay=0.8, reaction_sigma=0.3,
+                 accuracy=0.9, advertising_delay=0.0, play_game_writes=49, loop_interval=0.02, binary_metrics=False, seed=None):
+        self.address = address
+        self.binary_metrics = binary_metrics
+        self.metric_sequence = 0
+        self.answer_delay = answer_delay
+        self.reaction_sigma = reaction_sigma
+        self.accuracy = accuracy
+        self.play_game_writes = play_game_writes
+        self.loop_interval = loop_interval
+        self.random = random.Random(seed)
+        self.started = False
+
+        self.device = FakeDevice(name, address, [NANO33BLE_SERVICE_UUID], advertising_delay)
+        self.client = FakeBleakClient(address, radio_latency, jitter=jitter, seed=seed, services=[
+            FakeService(NANO33BLE_SERVICE_UUID, [
+                FakeCharacteristic(NANO33BLE_SPEECH_UUID, ["read", "write", "notify"]),
+                FakeCharacteristic(NANO33BLE_COLOR_UUID, ["read", "write", "notify"]),
+                FakeCharacteristic(NANO33BLE_METRICS_UUID, ["read", "notify"]),
+            ]),
+        ])
+        self.client.write_handlers[NANO33BLE_COLOR_UUID] = self.color_written
+
+        # Color code of the LED, and the perf_counter time each color was written to the board.
+        self.led = 0
+        self.colors_received = []
+
+    # Method for powering the board on. Does nothing after the first call.
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        loop = asyncio.get_running_loop()
+        for i in range(self.play_game_writes):
+            loop.call_later(self.device.advertising_delay + i * self.loop_interval,
+                            self.client.peripheral_write, NANO33BLE_SPEECH_UUID, "Command: PlayGame")
+
+    # Method for the firmware's colorWriteCallback, which lights the LED. The player reacts to it.
+    def color_written(self, value):
+        self.led = value[0]
+        self.colors_received.append(time.perf_counter())
+        if not 1 <= self.led <= 3:
+            return
+
+        words = ["Yes", "No", "Unknown"]
+        word = words[self.led - 1]
+        if self.random.random() >= self.accuracy:
+            word = self.random.choice([other for other in words if other != word])
+        reaction_time = self.answer_delay * self.random.lognormvariate(0.0, self.reaction_sigma)
+        asyncio.get_running_loop().call_later(reaction_time, self.say, word)
+
+    # Method for the firmware hearing a word, which it only sends while connected.
+    def say(self, word):
+        if not self.client.is_connected:
+            return
+        # Latencies in milliseconds, like the firmware measures them.
+        wake_latency = self.random.uniform(20.0, 100.0)
+        ble_write_latency = self.random.uniform(0.1, 0.5)
+        if not self.binary_metrics:
+            self.client.peripheral_write(NANO33BLE_METRICS_UUID, f"wake_latency:{wake_latency:.2f}")
+            self.client.peripheral_write(NANO33BLE_SPEECH_UUID, word)
+            self.client.peripheral_write(NANO33BLE_METRICS_UUID, f"ble_write_latency:{ble_write_latency:.2f}")
+            return
+
+        self.client.peripheral_write(NANO33BLE_SPEECH_UUID, word)
+        micros = int(time.perf_counter() * 1e6)
+        self.client.peripheral_write(NANO33BLE_METRICS_UUID, encode_metric_frame([
+            ("wake_latency", self.metric_sequence, micros, wake_latency),
+            ("ble_write_latency", self.metric_sequence + 1, micros, ble_write_latency),
+        ]))
+        self.metric_sequence += 2
+
+
+# Method for stand-ins of BleakScanner and BleakClient that only see the given fake boards. Scanning
+# powers the boards on.
+def fake_bleak(boards):
+    boards = {board.address: board for board in boards}
+
+    def scanner(detection_callback=None, **kwargs):
+        for board in boards.values():
+            board.start()
+        return FakeBleakScanner([board.device for board in boards.values()], detection_callback)
+
+    def client(address, disconnected_callback=None, adapter=None, **kwargs):
+        if address not in boards:
+            raise ConnectionError(f"Device with address {address} was not found.")
+        board = boards[address]
+        board.start()
+        board.client.disconnected_callback = disconnected_callback
+        board.client.adapter = adapter
+        return board.client
+
+    return scanner, client
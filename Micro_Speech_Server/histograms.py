@@ -0,0 +1,148 @@
+from array import array
+import json
+import math
+import os
+import time
+
+
+# Default location for dumping the latency histograms as JSON.
+LATENCY_HISTOGRAMS_PATH = "latency_histograms.json"
+
+# Histograms count latencies in whole microseconds. Below 2**SUB_BUCKET_BITS microseconds every value
+# has its own bucket, above that each power of two is split into 2**(SUB_BUCKET_BITS - 1) buckets, so
+# any value is known to within 1/64 of itself. Latencies above the highest trackable value, an hour,
+# count in the last bucket, which keeps every histogram at a fixed 1708 buckets.
+SUB_BUCKET_BITS = 7
+HIGHEST_TRACKABLE_US = 3600 * 1000000
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+# Method for the bucket of a latency in microseconds.
+def bucket_index(value):
+    if value < 1 << SUB_BUCKET_BITS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+# Method for the lowest latency in microseconds that counts in a bucket.
+def bucket_lowest(index):
+    if index < 1 << SUB_BUCKET_BITS:
+        return index
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    return (index - (shift << (SUB_BUCKET_BITS - 1))) << shift
+
+
+# Histogram of latencies in the style of HdrHistogram: log-linear buckets of fixed size, so recording
+# is a constant time increment and percentiles are read from the counts without keeping any samples.
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * (bucket_index(HIGHEST_TRACKABLE_US) + 1)))
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    # Method for counting a latency given in seconds.
+    def record(self, seconds):
+        value = int(seconds * 1000000)
+        if value < 0:
+            value = 0
+        elif value > HIGHEST_TRACKABLE_US:
+            value = HIGHEST_TRACKABLE_US
+        self.counts[bucket_index(value)] += 1
+        if not self.count:
+            self.min = self.max = value
+        elif value < self.min:
+            self.min = value
+        elif value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+
+    # Method for the latency in seconds that the given fraction of recorded latencies are at or below,
+    # rounded up to the end of its bucket but never past the largest latency recorded.
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bucket_lowest(index + 1) - 1, self.max) / 1000000
+        return self.max / 1000000
+
+    # Method for count, min, mean, p50, p90, p99 and max, the latencies in milliseconds.
+    def summary(self):
+        summary = {"count": self.count}
+        if self.count:
+            summary["min_ms"] = self.min / 1000
+            summary["mean_ms"] = self.total / self.count / 1000
+            for fraction in PERCENTILES:
+                summary[f"p{fraction * 100:g}_ms"] = self.percentile(fraction) * 1000
+            summary["max_ms"] = self.max / 1000
+        return summary
+
+    # Method for the summary with the non-empty buckets as [lowest microseconds, count] pairs, which
+    # lets histograms from different runs be compared bucket by bucket.
+    def to_json(self):
+        data = self.summary()
+        data["buckets"] = [[bucket_lowest(index), count] for index, count in enumerate(self.counts) if count]
+        return data
+
+    # Method for a one line summary, e.g. for the game over screen.
+    def describe(self):
+        if not self.count:
+            return "no samples"
+        return (", ".join(f"p{fraction * 100:g} {self.percentile(fraction) * 1000:.1f} ms" for fraction in PERCENTILES)
+                + f", max {self.max / 1000:.1f} ms over {self.count} samples")
+
+
+# Latency histograms by name, e.g. one registry per board. Every latency recorded in a registry is also
+# recorded in its parent, which keeps the totals over all boards, and a parent can dump itself and
+# all its children to a JSON file.
+class LatencyRegistry:
+    def __init__(self, name="global", parent=None, path=None):
+        self.name = name
+        self.parent = parent
+        self.path = path
+        self.histograms = {}
+        self.children = {}
+        if parent is not None:
+            parent.children[name] = self
+
+    # Method for the histogram of the given name, created when it is first needed.
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        return histogram
+
+    # Method for recording a latency in seconds here and in the parents.
+    def record(self, name, seconds):
+        registry = self
+        while registry is not None:
+            registry.histogram(name).record(seconds)
+            registry = registry.parent
+
+    def to_json(self):
+        return {name: histogram.to_json() for name, histogram in self.histograms.items()}
+
+    # Method for writing this registry and its children to the registry's path, if it has one, through
+    # a temporary file so a crash never leaves a half written file.
+    def save(self):
+        if self.path is None:
+            return
+        data = {
+            "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            self.name: self.to_json(),
+            "sessions": {name: child.to_json() for name, child in self.children.items()},
+        }
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as histograms_file:
+            json.dump(data, histograms_file, indent=2)
+        os.replace(temp_path, self.path)
+
+
+# Registry of the latencies of all boards and Gemini requests in this process.
+latencies = LatencyRegistry()
@@ -0,0 +1,39 @@
+import struct
+
+
+# Binary metric frames sent on the metrics characteristic. A frame is one version byte followed by
+# one or more samples, each packed little-endian as:
+#   uint8   metric type id, see METRIC_TYPES
+#   uint16  sequence number, counting every sample the board sends and wrapping at 65536
+#   uint32  device timestamp in microseconds, from micros()
+#   float32 value
+# The version byte is never printable, so frames cannot be mistaken for the firmware's text metrics
+# like "wake_latency:12.34", which are still accepted.
+METRIC_FRAME_VERSION = 1
+METRIC_SAMPLE = struct.Struct("<BHIf")
+METRIC_TYPES = {1: "wake_latency", 2: "ble_write_latency"}
+METRIC_TYPE_IDS = {name: type_id for type_id, name in METRIC_TYPES.items()}
+
+
+# Method for packing samples of (name, sequence, timestamp in microseconds, value) into one frame.
+def encode_metric_frame(samples):
+    frame = bytearray([METRIC_FRAME_VERSION])
+    for name, sequence, timestamp, value in samples:
+        frame += METRIC_SAMPLE.pack(METRIC_TYPE_IDS[name], sequence & 0xFFFF, timestamp & 0xFFFFFFFF, value)
+    return bytes(frame)
+
+# Method for the samples in a metrics notification as (name, sequence, timestamp in microseconds, value).
+# Binary frames are unpacked straight from the notification buffer without copying it. A text metric
+# is one sample without sequence number and timestamp. Raises ValueError for a malformed notification.
+def decode_metrics(data):
+    if data and data[0] == METRIC_FRAME_VERSION:
+        samples = memoryview(data)[1:]
+        if len(samples) == 0 or len(samples) % METRIC_SAMPLE.size:
+            raise ValueError(f"Metric frame of {len(data)} bytes is not a whole number of samples.")
+        return [(METRIC_TYPES.get(type_id, f"metric_{type_id}"), sequence, timestamp, value)
+                for type_id, sequence, timestamp, value in METRIC_SAMPLE.iter_unpack(samples)]
+
+    name, separator, value = bytes(data).decode("utf-8").strip().partition(":")
+    if not separator:
+        raise ValueError(f"Metric {name!r} has no value.")
+    return [(name, None, None, float(value))]
@@ -0,0 +1,112 @@
+import asyncio
+
+from histograms import bucket_lowest, latencies
+
+
+# Address the metrics endpoint listens on by default. Only local scrapers can reach it.
+METRICS_HOST = "127.0.0.1"
+# Seconds a scraper gets to send its request before the connection is closed.
+METRICS_REQUEST_TIMEOUT = 5.0
+# Upper bounds in seconds of the latency buckets in the exposition, which are summed from the finer
+# buckets of the latency histograms.
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Counters of the server and their help texts.
+COUNTERS = {
+    "games_played": "Games played to the end.",
+    "rounds_played": "Game rounds played, answered or not.",
+    "answer_timeouts": "Rounds the player did not answer in time.",
+    "reconnects": "Connections made to a board after its first one.",
+}
+
+
+# Method for escaping a label value in the text exposition format.
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# Method for labels as they follow a metric name, e.g. {board="00:00:00:00:00:00"}.
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+# Counters, gauges and the latency histograms of the server, rendered in the Prometheus text format.
+# Counters are plain numbers bumped where things happen, and gauges are read from the sessions when
+# scraped, so a scrape only formats what is already aggregated and costs the same however long the
+# server has been running.
+class Metrics:
+    def __init__(self, latencies=latencies, prefix="micro_speech"):
+        self.latencies = latencies
+        self.prefix = prefix
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # Gauge name to its help text and a method returning (labels, value) pairs.
+        self.gauges = {}
+        self.scrapes = 0
+
+    def inc(self, name, amount=1):
+        self.counters[name] += amount
+
+    # Method for adding a gauge whose values are collected on each scrape.
+    def gauge(self, name, help_text, collect):
+        self.gauges[name] = (help_text, collect)
+
+    def render(self):
+        lines = []
+        for name, value in self.counters.items():
+            metric = f"{self.prefix}_{name}_total"
+            lines += [f"# HELP {metric} {COUNTERS[name]}", f"# TYPE {metric} counter", f"{metric} {value}"]
+
+        for name, (help_text, collect) in self.gauges.items():
+            metric = f"{self.prefix}_{name}"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            lines += [f"{metric}{format_labels(labels)} {value}" for labels, value in collect()]
+
+        # The latency histograms, summed into the coarser exposition buckets in one pass each.
+        metric = f"{self.prefix}_latency_seconds"
+        lines += [f"# HELP {metric} Latencies of Gemini requests, the boards and BLE round trips.", f"# TYPE {metric} histogram"]
+        for name, histogram in self.latencies.histograms.items():
+            bounds = iter(METRICS_LATENCY_BUCKETS)
+            bound = next(bounds)
+            cumulative = 0
+            for index, count in enumerate(histogram.counts):
+                if not count:
+                    continue
+                while bound is not None and bucket_lowest(index) >= bound * 1000000:
+                    lines.append(f'{metric}_bucket{{latency="{name}",le="{bound:g}"}} {cumulative}')
+                    bound = next(bounds, None)
+                cumulative += count
+            while bound is not None:
+                lines.append(f'{metric}_bucket{{latency="{name}",le="{bound:g}"}} {cumulative}')
+                bound = next(bounds, None)
+            lines.append(f'{metric}_bucket{{latency="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{latency="{name}"}} {histogram.total / 1000000}')
+            lines.append(f'{metric}_count{{latency="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    # Asynchronous method for answering one HTTP request on the event loop. GET /metrics returns the
+    # metrics, anything else a 404.
+    async def handle_request(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), METRICS_REQUEST_TIMEOUT)
+            method, path, _ = request.split(b"\r\n", 1)[0].decode("latin-1").split(" ", 2)
+            if method == "GET" and path.split("?", 1)[0] == "/metrics":
+                self.scrapes += 1
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", self.render().encode("utf-8")
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"Not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                         "Connection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # Asynchronous method for serving the metrics on the given port until the returned server is closed.
+    async def serve(self, port, host=METRICS_HOST):
+        return await asyncio.start_server(self.handle_request, host, port)
+
+
+# Metrics of this process.
+metrics = Metrics()
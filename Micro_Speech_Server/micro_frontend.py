@@ -0,0 +1,417 @@
+import wave
+
+import numpy as np
+
+
+# Settings of the feature generator in micro_speech_BLE/micro_features_micro_features_generator.cpp
+# and micro_features_micro_model_settings.h, which the wake word model was trained on.
+FRONTEND_SAMPLE_RATE = 16000
+FRONTEND_WINDOW_MS = 30
+FRONTEND_STRIDE_MS = 20
+FRONTEND_CHANNELS = 40
+FRONTEND_LOWER_BAND_LIMIT = 125.0
+FRONTEND_UPPER_BAND_LIMIT = 7500.0
+FRONTEND_SMOOTHING_BITS = 10
+FRONTEND_EVEN_SMOOTHING = 0.025
+FRONTEND_ODD_SMOOTHING = 0.06
+FRONTEND_MIN_SIGNAL_REMAINING = 0.05
+FRONTEND_PCAN_STRENGTH = 0.95
+FRONTEND_PCAN_OFFSET = 80.0
+FRONTEND_PCAN_GAIN_BITS = 21
+FRONTEND_LOG_SCALE_SHIFT = 6
+
+# Fixed point scales of the TensorFlow Lite Micro frontend library the firmware links against.
+WINDOW_BITS = 12
+FILTERBANK_BITS = 12
+PCAN_SNR_BITS = 12
+PCAN_OUTPUT_BITS = 6
+NOISE_REDUCTION_BITS = 14
+LOG_SEGMENTS_LOG2 = 7
+LOG_COEFF = 45426
+# Windows the fixed point FFT processes at once.
+FIXED_POINT_BLOCK_WINDOWS = 256
+
+# Correction from log2(1 + x) to x at 129 points from 0 to 1, in 16 bit fixed point, like kLogLut.
+LOG_LUT = np.round(65536 * (np.log2(1 + np.arange(129) / 128) - np.arange(129) / 128)).astype(np.int64)
+
+# Scale from frontend outputs, roughly 0 to 670, to the int8 model input, as in GenerateMicroFeatures.
+FEATURE_VALUE_SCALE = 256
+FEATURE_VALUE_DIV = int(25.6 * 26.0 + 0.5)
+
+
+# Method for a 16 bit mono WAV file as an int16 array, e.g. the test clips in micro_speech_BLE/data.
+def read_wav(path):
+    with wave.open(path, "rb") as wav_file:
+        if wav_file.getsampwidth() != 2 or wav_file.getnchannels() != 1:
+            raise ValueError(f"{path} is not 16 bit mono audio.")
+        return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2").astype(np.int16)
+
+# Method for the frontend's mel scale, in single precision like the firmware computes it.
+def freq_to_mel(freq):
+    return np.float32(1127.0 * np.log1p(np.float64(freq) / 700.0))
+
+# Method for frontend outputs as the int8 features the model takes, rounded and clamped like
+# GenerateMicroFeatures does it.
+def quantize_features(features):
+    if np.issubdtype(features.dtype, np.integer):
+        values = (features.astype(np.int32) * FEATURE_VALUE_SCALE + FEATURE_VALUE_DIV // 2) // FEATURE_VALUE_DIV
+    else:
+        values = np.floor((features * FEATURE_VALUE_SCALE + FEATURE_VALUE_DIV // 2) / FEATURE_VALUE_DIV)
+    return np.clip(values - 128, -128, 127).astype(np.int8)
+
+# Method for wrapping integers to int16 like storing them in an int16_t does, kept in an int32 array.
+def wrap16(values):
+    return values.astype(np.int16).astype(np.int32)
+
+# Method for the Q15 rounding of kissfft's fixed point multiplications.
+def sround(values):
+    return (values + (1 << 14)) >> 15
+
+# Method for the Q15 complex product of kissfft's C_MUL, both operands given as (real, imaginary).
+def complex_multiply(a, b):
+    return (wrap16(sround(a[0] * b[0] - a[1] * b[1])), wrap16(sround(a[0] * b[1] + a[1] * b[0])))
+
+# Method for the number of bits of each value, i.e. one more than the index of its most significant
+# bit, or zero for zero. Exact for values below 2**53.
+def bit_lengths(values):
+    return np.frexp(values.astype(np.float64))[1].astype(np.int64)
+
+# Method for the rounded integer square roots of Sqrt32 and Sqrt64: the root is rounded down and then
+# up if the remainder is larger than it, unless that would overflow the 16 or 32 bit result.
+def rounded_sqrt(values):
+    values = values.astype(np.int64)
+    root = np.floor(np.sqrt(values.astype(np.float64))).astype(np.int64)
+    root -= root * root > values
+    root += (root + 1) * (root + 1) <= values
+    cap = np.where(values < 1 << 32, 0xFFFF, 0xFFFFFFFF)
+    return root + ((values - root * root > root) & (root != cap))
+
+# Method for the gain lookup table of PcanGainLookupFunction and PcanGainLookupPopulate: the gain at
+# noise estimates 0 and 1, then three coefficients of a quadratic for each power of two interval
+# from 2 up, four entries apart, all in single precision like the firmware computes them.
+def pcan_gain_lut(input_bits):
+    def gain(x):
+        x_as_float = np.float32(x) / np.float32(1 << input_bits)
+        value = np.float32(1 << FRONTEND_PCAN_GAIN_BITS) * np.float32(
+            np.float64(x_as_float + np.float32(FRONTEND_PCAN_OFFSET)) ** np.float64(np.float32(-FRONTEND_PCAN_STRENGTH)))
+        if value > 0x7FFF:
+            return 0x7FFF
+        return int(value + np.float32(0.5))
+
+    lut = [gain(0), gain(1)]
+    for interval in range(2, 33):
+        x0 = 1 << (interval - 1)
+        x1 = x0 + (x0 >> 1)
+        x2 = x0 + x0 - 1 if interval == 32 else 2 * x0
+        y0, y1, y2 = gain(x0), gain(x1), gain(x2)
+        diff1 = y1 - y0
+        diff2 = y2 - y0
+        a1 = 4 * diff1 - diff2
+        a2 = diff2 - a1
+        lut += [y0, a1, a2, 0]
+    return wrap16(np.array(lut[:-1], dtype=np.int64)).astype(np.int64)
+
+
+# Host side port of the feature generator of the firmware: 30 ms Hann windows every 20 ms, a 40
+# channel mel filterbank from 125 to 7500 Hz, noise reduction, PCAN gain control and log scale. A
+# whole clip, or a batch of clips of the same length, is processed at once: all windows go through
+# one DFT and one filterbank matrix product, and only the noise estimate, which carries over from
+# window to window, is stepped through the windows, for all clips and channels together. The noise
+# estimate starts at zero for each clip, like a freshly initialized frontend.
+#
+# By default this is a floating point model of the firmware's fixed point frontend. Its int8 features
+# are within a few steps of the board's for speech, but channels the fixed point FFT fills with
+# rounding noise, e.g. next to a loud pure tone, come out quieter. The fixed point path repeats the
+# integer arithmetic of the frontend library step for step, FFT included, and gives the same outputs
+# as the library, at a fraction of the speed.
+class MicroFrontend:
+    def __init__(self, sample_rate=FRONTEND_SAMPLE_RATE, num_channels=FRONTEND_CHANNELS):
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.window_size = FRONTEND_WINDOW_MS * sample_rate // 1000
+        self.window_step = FRONTEND_STRIDE_MS * sample_rate // 1000
+        self.fft_size = 1 << (self.window_size - 1).bit_length()
+        self.spectrum_size = self.fft_size // 2 + 1
+
+        # Hann window, with the 12 bit coefficients of the fixed point frontend.
+        arg = np.float32(np.pi * 2.0 / self.window_size)
+        window = (0.5 - 0.5 * np.cos(np.float64(arg) * (np.arange(self.window_size) + 0.5))).astype(np.float32)
+        self.window = window
+        self.window_coefficients = np.floor(window * np.float32(1 << WINDOW_BITS) + 0.5).astype(np.int16)
+
+        self.populate_filterbank()
+
+        # The FFT bins the filterbank uses, as one matrix from audio windows to the real and imaginary
+        # parts of their windowed DFT. A matrix product for all windows of a batch at once beats an
+        # FFT per window, as only the bins between the band limits are needed.
+        bins = np.arange(self.start_index, self.end_index)
+        phase = 2 * np.pi * np.outer(np.arange(self.window_size), bins) / self.fft_size
+        self.dft = (np.concatenate([np.cos(phase), -np.sin(phase)], axis=1) * self.window[:, np.newaxis]).astype(np.float32)
+
+        # The filterbank output is scaled down by this many bits relative to the FFT size, and PCAN
+        # and the log scale correct for it.
+        self.correction_bits = self.fft_size.bit_length() - 1 - FILTERBANK_BITS // 2
+        self.smoothing = np.where(np.arange(num_channels) % 2 == 0, FRONTEND_EVEN_SMOOTHING, FRONTEND_ODD_SMOOTHING).astype(np.float32)
+
+        # The same settings in the fixed point scales of the frontend library.
+        self.integer_smoothing = np.where(np.arange(num_channels) % 2 == 0, int(FRONTEND_EVEN_SMOOTHING * (1 << NOISE_REDUCTION_BITS)),
+                                          int(FRONTEND_ODD_SMOOTHING * (1 << NOISE_REDUCTION_BITS))).astype(np.int64)
+        self.min_signal_remaining = int(FRONTEND_MIN_SIGNAL_REMAINING * (1 << NOISE_REDUCTION_BITS))
+        self.gain_lut = pcan_gain_lut(FRONTEND_SMOOTHING_BITS - self.correction_bits)
+        self.snr_shift = FRONTEND_PCAN_GAIN_BITS - self.correction_bits - PCAN_SNR_BITS
+        self.populate_fft()
+
+    # Method for the triangular mel filters, laid out like FilterbankPopulateState does it: each of the
+    # num_channels + 1 bands is a run of FFT bins between two center frequencies. A bin's weight goes to
+    # the channel centered below it, falling towards the band's top, and its unweight (one minus the
+    # weight) to the channel centered above it. The first band has no channel below it, and the last
+    # none above it.
+    def populate_filterbank(self):
+        num_bands = self.num_channels + 1
+        mel_low = freq_to_mel(np.float32(FRONTEND_LOWER_BAND_LIMIT))
+        mel_high = freq_to_mel(np.float32(FRONTEND_UPPER_BAND_LIMIT))
+        mel_spacing = np.float32(mel_high - mel_low) / np.float32(num_bands)
+        center_mels = np.array([mel_low + mel_spacing * np.float32(i + 1) for i in range(num_bands)], dtype=np.float32)
+
+        # Everything up to the lower band limit is left out, DC included.
+        hz_per_bin = np.float32(0.5 * self.sample_rate / np.float32(self.spectrum_size - 1))
+        self.start_index = int(1.5 + FRONTEND_LOWER_BAND_LIMIT / hz_per_bin)
+        self.end_index = 0
+
+        weights = np.zeros((self.spectrum_size, self.num_channels), dtype=np.float32)
+        unweights = np.zeros((self.spectrum_size, self.num_channels), dtype=np.float32)
+        integer_weights = np.zeros((self.spectrum_size, self.num_channels), dtype=np.int64)
+        integer_unweights = np.zeros((self.spectrum_size, self.num_channels), dtype=np.int64)
+        band_start = self.start_index
+        for band in range(num_bands):
+            band_end = band_start
+            while freq_to_mel(np.float32(band_end) * hz_per_bin) <= center_mels[band]:
+                band_end += 1
+
+            lower_mel = mel_low if band == 0 else center_mels[band - 1]
+            for freq_index in range(band_start, band_end):
+                weight = (center_mels[band] - freq_to_mel(np.float32(freq_index) * hz_per_bin)) / (center_mels[band] - lower_mel)
+                if band > 0:
+                    weights[freq_index, band - 1] = weight
+                    integer_weights[freq_index, band - 1] = np.floor(weight * np.float32(1 << FILTERBANK_BITS) + 0.5)
+                if band < self.num_channels:
+                    unweights[freq_index, band] = 1.0 - weight
+                    integer_unweights[freq_index, band] = np.floor((1.0 - np.float64(weight)) * (1 << FILTERBANK_BITS) + 0.5)
+            self.end_index = max(self.end_index, band_end)
+            band_start = band_end
+        if self.end_index >= self.spectrum_size:
+            raise ValueError("Filterbank end index is above the spectrum size.")
+
+        # Both halves of each triangle in one matrix from FFT bin energies to channels.
+        self.filterbank = weights + unweights
+        self.integer_filterbank = integer_weights + integer_unweights
+
+    # Method for the plan of kissfft's fixed point real FFT, which the frontend library uses: a complex
+    # FFT of half the size over pairs of samples, in radix 4 stages, followed by a split into the
+    # spectrum of the real input. The order kf_work reads the input in, and the Q15 twiddles of the
+    # stages and the split, are worked out once here.
+    def populate_fft(self):
+        size = self.fft_size // 2
+        if size != 1 << 2 * ((size.bit_length() - 1) // 2):
+            raise ValueError("Fixed point FFT size is not a power of 4.")
+
+        order = np.empty(size, dtype=np.int64)
+        def work(output, start, stride, m):
+            for q in range(4):
+                if m == 1:
+                    order[output + q] = start + q * stride
+                else:
+                    work(output + q * m, start + q * stride, stride * 4, m // 4)
+        work(0, 0, 1, size // 4)
+        self.fft_order = order
+
+        phase = -2 * np.pi * np.arange(size) / size
+        self.fft_twiddles = (np.floor(0.5 + 0x7FFF * np.cos(phase)).astype(np.int32), np.floor(0.5 + 0x7FFF * np.sin(phase)).astype(np.int32))
+        phase = -np.pi * ((np.arange(size // 2) + 1) / size + 0.5)
+        self.fft_super_twiddles = (np.floor(0.5 + 0x7FFF * np.cos(phase)).astype(np.int32), np.floor(0.5 + 0x7FFF * np.sin(phase)).astype(np.int32))
+
+    # Method for all windows of a clip, or of each clip in a batch, as a view of the audio of shape
+    # (..., windows, window_size). A partial window at the end is left out, as the frontend waits for
+    # more samples before processing it.
+    def frames(self, audio):
+        audio = np.asarray(audio)
+        if audio.shape[-1] < self.window_size:
+            return np.empty(audio.shape[:-1] + (0, self.window_size), dtype=audio.dtype)
+        windows = np.lib.stride_tricks.sliding_window_view(audio, self.window_size, axis=-1)
+        return windows[..., ::self.window_step, :]
+
+    # Method for the frontend outputs of a clip of int16 audio, or a batch of equally long clips, as an
+    # array of shape (..., windows, num_channels) in the scale of the firmware's 16 bit outputs. With
+    # fixed_point the outputs are computed in the integer arithmetic of the frontend library instead.
+    def features(self, audio, fixed_point=False):
+        if fixed_point:
+            return self.fixed_point_features(audio)
+
+        # One two dimensional product over all windows, which BLAS handles better than a stack of them.
+        frames = self.frames(audio)
+        spectrum = (frames.reshape(-1, self.window_size).astype(np.float32) @ self.dft).reshape(frames.shape[:-1] + (-1,))
+        num_bins = self.end_index - self.start_index
+        energy = spectrum[..., :num_bins] ** 2 + spectrum[..., num_bins:] ** 2
+
+        # The fixed point frontend's FFT is scaled down by its size and its filterbank and square
+        # root leave the result 2**(FILTERBANK_BITS / 2) larger, which nets out to a factor of 1/8
+        # at 16 kHz. Values are rounded down where the fixed point frontend drops fractions, which
+        # keeps quiet channels at zero like on the board.
+        scale = np.float32(2 ** (FILTERBANK_BITS // 2) / self.fft_size)
+        signal = np.floor(np.sqrt(energy @ self.filterbank[self.start_index:self.end_index]) * scale)
+        signal = self.reduce_noise(signal)
+        return self.log_scale(signal)
+
+    # Method for noise reduction followed by PCAN gain control. The noise estimate of each channel
+    # follows the signal with the channel's smoothing factor, and is subtracted from it down to a
+    # small share of the signal. PCAN then divides each channel by a power of its noise estimate.
+    def reduce_noise(self, signal):
+        output = np.empty_like(signal)
+        estimate = np.zeros(signal.shape[:-2] + signal.shape[-1:], dtype=np.float32)
+        correction = np.float32(1 << self.correction_bits)
+        for index in range(signal.shape[-2]):
+            frame = signal[..., index, :]
+            estimate = self.smoothing * frame + (1 - self.smoothing) * estimate
+            reduced = np.floor(np.maximum(frame - estimate, frame * np.float32(FRONTEND_MIN_SIGNAL_REMAINING)))
+            gain = (estimate * correction + np.float32(FRONTEND_PCAN_OFFSET)) ** np.float32(-FRONTEND_PCAN_STRENGTH)
+            output[..., index, :] = reduced * gain * correction
+        return output
+
+    # Method for shrinking the PCAN signal to noise ratio and taking its log, in the output scale of
+    # the fixed point frontend.
+    def log_scale(self, snr):
+        shrunk = np.floor(np.where(snr < 2, snr * snr / 4, snr - 1) * np.float32(1 << PCAN_OUTPUT_BITS))
+        value = shrunk * np.float32(1 << self.correction_bits)
+        logged = np.log(np.maximum(value, 1)) * np.float32(1 << FRONTEND_LOG_SCALE_SHIFT)
+        return np.minimum(logged, np.float32(0x7FFF))
+
+    # Method for the fixed point FFT of windows zero padded to the FFT size, given as int16 values in
+    # an int32 array of shape (windows, fft_size). Returns the real and imaginary parts of the bins up
+    # to half the FFT size, wrapped and rounded at every step like kiss_fftr does with 16 bit scalars.
+    def fixed_point_fft(self, samples):
+        size = self.fft_size // 2
+        real = samples[:, 0::2][:, self.fft_order]
+        imag = samples[:, 1::2][:, self.fft_order]
+
+        # Radix 4 butterflies of kf_bfly4, each stage over all windows and groups at once. Inputs are
+        # divided by 4 first, which keeps the 16 bit values from overflowing.
+        cos, sin = self.fft_twiddles
+        m = 1
+        while m < size:
+            stride = size // (4 * m)
+            index = np.arange(m) * stride
+            shape = (len(samples), size // (4 * m), 4, m)
+            real = wrap16(sround(real.reshape(shape) * (0x7FFF // 4)))
+            imag = wrap16(sround(imag.reshape(shape) * (0x7FFF // 4)))
+            scratch0 = complex_multiply((real[:, :, 1], imag[:, :, 1]), (cos[index], sin[index]))
+            scratch1 = complex_multiply((real[:, :, 2], imag[:, :, 2]), (cos[2 * index], sin[2 * index]))
+            scratch2 = complex_multiply((real[:, :, 3], imag[:, :, 3]), (cos[3 * index], sin[3 * index]))
+            real0, imag0 = real[:, :, 0], imag[:, :, 0]
+            scratch5 = (wrap16(real0 - scratch1[0]), wrap16(imag0 - scratch1[1]))
+            real0, imag0 = wrap16(real0 + scratch1[0]), wrap16(imag0 + scratch1[1])
+            scratch3 = (wrap16(scratch0[0] + scratch2[0]), wrap16(scratch0[1] + scratch2[1]))
+            scratch4 = (wrap16(scratch0[0] - scratch2[0]), wrap16(scratch0[1] - scratch2[1]))
+            real = np.stack([wrap16(real0 + scratch3[0]), wrap16(scratch5[0] + scratch4[1]),
+                             wrap16(real0 - scratch3[0]), wrap16(scratch5[0] - scratch4[1])], axis=2).reshape(len(samples), size)
+            imag = np.stack([wrap16(imag0 + scratch3[1]), wrap16(scratch5[1] - scratch4[0]),
+                             wrap16(imag0 - scratch3[1]), wrap16(scratch5[1] + scratch4[0])], axis=2).reshape(len(samples), size)
+            m *= 4
+
+        # Split of the complex FFT into the spectrum of the real input, with bins k and size - k
+        # halved and combined through the super twiddles.
+        def halve(values):
+            return wrap16(sround(values * (0x7FFF // 2)))
+        output_real = np.zeros((len(samples), size + 1), dtype=np.int32)
+        output_imag = np.zeros((len(samples), size + 1), dtype=np.int32)
+        dc_real, dc_imag = halve(real[:, 0]), halve(imag[:, 0])
+        output_real[:, 0] = wrap16(dc_real + dc_imag)
+        output_real[:, size] = wrap16(dc_real - dc_imag)
+
+        k = np.arange(1, size // 2 + 1)
+        fpk = (halve(real[:, k]), halve(imag[:, k]))
+        fpnk = (halve(real[:, size - k]), halve(wrap16(-imag[:, size - k])))
+        f1k = (wrap16(fpk[0] + fpnk[0]), wrap16(fpk[1] + fpnk[1]))
+        f2k = (wrap16(fpk[0] - fpnk[0]), wrap16(fpk[1] - fpnk[1]))
+        tw = complex_multiply(f2k, self.fft_super_twiddles)
+        # Bin size / 2 is written twice, and the second write is the one that stays.
+        output_real[:, k[:-1]] = wrap16((f1k[0] + tw[0]) >> 1)[:, :-1]
+        output_imag[:, k[:-1]] = wrap16((f1k[1] + tw[1]) >> 1)[:, :-1]
+        output_real[:, size - k] = wrap16((f1k[0] - tw[0]) >> 1)
+        output_imag[:, size - k] = wrap16((tw[1] - f1k[1]) >> 1)
+        return output_real, output_imag
+
+    # Method for the frontend outputs in the fixed point arithmetic of the frontend library, as uint16
+    # values identical to FrontendProcessSamples run on each clip from a fresh state. Each window is
+    # scaled up to the full 16 bits before the FFT and the filterbank output back down by as much.
+    def fixed_point_features(self, audio):
+        frames = self.frames(audio)
+        windows = frames.reshape(-1, self.window_size).astype(np.int32)
+        windowed = wrap16((windows * self.window_coefficients) >> WINDOW_BITS)
+        input_shift = 15 - bit_lengths(wrap16(np.abs(windowed)).max(axis=1, initial=0))
+        samples = np.zeros((len(windows), self.fft_size), dtype=np.int32)
+        samples[:, :self.window_size] = wrap16(windowed << input_shift[:, np.newaxis].astype(np.int32))
+
+        # The FFT goes through the windows in blocks small enough for its stages to stay in cache.
+        # Energies are below 2**31 and weights at most 2**FILTERBANK_BITS, so the accumulated channels
+        # stay well within the integers a float64 product holds exactly.
+        bins = slice(self.start_index, self.end_index)
+        filterbank = self.integer_filterbank[bins].astype(np.float64)
+        accumulated = np.empty((len(windows), self.num_channels), dtype=np.int64)
+        for start in range(0, len(windows), FIXED_POINT_BLOCK_WINDOWS):
+            real, imag = self.fixed_point_fft(samples[start:start + FIXED_POINT_BLOCK_WINDOWS])
+            energy = real[:, bins].astype(np.int64) ** 2 + imag[:, bins].astype(np.int64) ** 2
+            accumulated[start:start + FIXED_POINT_BLOCK_WINDOWS] = energy.astype(np.float64) @ filterbank
+        signal = (rounded_sqrt(accumulated) >> input_shift[:, np.newaxis]).reshape(frames.shape[:-2] + (-1, self.num_channels))
+
+        reduced, estimates = self.fixed_point_reduce_noise(signal)
+        snr = ((reduced * self.fixed_point_gain(estimates)) >> self.snr_shift) & 0xFFFFFFFF
+        shrunk = np.where(snr < 2 << PCAN_SNR_BITS, (snr * snr) >> (2 + 2 * PCAN_SNR_BITS - PCAN_OUTPUT_BITS),
+                          (snr >> (PCAN_SNR_BITS - PCAN_OUTPUT_BITS)) - (1 << PCAN_OUTPUT_BITS))
+        return self.fixed_point_log_scale(shrunk)
+
+    # Method for NoiseReductionApply stepped through the windows, returning the reduced signal and the
+    # noise estimate after each window, which PCAN takes its gain from.
+    def fixed_point_reduce_noise(self, signal):
+        reduced = np.empty_like(signal)
+        estimates = np.empty_like(signal)
+        estimate = np.zeros(signal.shape[:-2] + signal.shape[-1:], dtype=np.int64)
+        one_minus_smoothing = (1 << NOISE_REDUCTION_BITS) - self.integer_smoothing
+        for index in range(signal.shape[-2]):
+            frame = signal[..., index, :]
+            scaled_up = (frame << FRONTEND_SMOOTHING_BITS) & 0xFFFFFFFF
+            estimate = ((scaled_up * self.integer_smoothing + estimate * one_minus_smoothing) >> NOISE_REDUCTION_BITS) & 0xFFFFFFFF
+            estimates[..., index, :] = estimate
+            floor = (frame * self.min_signal_remaining) >> NOISE_REDUCTION_BITS
+            reduced[..., index, :] = np.maximum((scaled_up - np.minimum(estimate, scaled_up)) >> FRONTEND_SMOOTHING_BITS, floor)
+        return reduced, estimates
+
+    # Method for the PCAN gains of WideDynamicFunction: a quadratic in the noise estimate, with the
+    # coefficients of the power of two interval the estimate falls in.
+    def fixed_point_gain(self, estimates):
+        interval = np.maximum(bit_lengths(estimates), 2)
+        lut = self.gain_lut
+        base = 4 * interval - 6
+        fraction = np.where(interval < 11, estimates << np.maximum(11 - interval, 0), estimates >> np.maximum(interval - 11, 0)) & 0x3FF
+        result = (lut[base + 2] * fraction) >> 5
+        result = ((result + (lut[base + 1] << 5)) * fraction + (1 << 14)) >> 15
+        result = wrap16(result + lut[base]).astype(np.int64)
+        return np.where(estimates <= 2, lut[np.minimum(estimates, 2)], result)
+
+    # Method for LogScaleApply: the log of each value from its most significant bit and a piecewise
+    # linear correction of the bits below it, scaled to the output and clamped to 15 bits.
+    def fixed_point_log_scale(self, values):
+        values = (values << self.correction_bits) & 0xFFFFFFFF
+        clamped = np.maximum(values, 2)
+        integer = bit_lengths(clamped) - 1
+        fraction = clamped - (1 << integer)
+        fraction = np.where(integer < 16, fraction << np.maximum(16 - integer, 0), fraction >> np.maximum(integer - 16, 0))
+        segment = fraction >> (16 - LOG_SEGMENTS_LOG2)
+        c0, c1 = LOG_LUT[segment], LOG_LUT[segment + 1]
+        fraction += c0 + (((c1 - c0) * (fraction - (segment << (16 - LOG_SEGMENTS_LOG2)))) >> 16)
+        loge = (LOG_COEFF * ((integer << 16) + fraction) + (1 << 15)) >> 16
+        logged = ((loge << FRONTEND_LOG_SCALE_SHIFT) + (1 << 15)) >> 16
+        return np.minimum(np.where(values > 1, logged, 0), 0x7FFF).astype(np.uint16)
+
+    # Method for the int8 model input of a clip or batch of clips, shaped (..., windows, num_channels).
+    def int8_features(self, audio, fixed_point=False):
+        return quantize_features(self.features(audio, fixed_point))
@@ -0,0 +1,446 @@
+import math
+import os
+import re
+import struct
+
+import numpy as np
+
+
+# The wake word model as the firmware embeds it, the g_model array made with xxd -i.
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "micro_speech_BLE", "micro_features_model.cpp")
+# Labels of the model outputs, as kCategoryLabels in micro_features_micro_model_settings.cpp.
+MODEL_LABELS = ("silence", "unknown", "yes", "no")
+# Samples run through the graph at once, which bounds the memory of the intermediate tensors.
+MODEL_BLOCK_SIZE = 256
+
+# Builtin operator codes, tensor types and fused activations of the TFLite schema that this
+# interpreter knows.
+DEPTHWISE_CONV_2D = 4
+FULLY_CONNECTED = 9
+RESHAPE = 22
+SOFTMAX = 25
+TENSOR_TYPES = {0: np.float32, 2: np.int32, 3: np.uint8, 4: np.int64, 7: np.int16, 9: np.int8}
+PADDING_SAME = 0
+ACTIVATION_NONE = 0
+ACTIVATION_RELU = 1
+ACTIVATION_RELU_N1_TO_1 = 2
+ACTIVATION_RELU6 = 3
+
+INT32_MIN = -(1 << 31)
+INT32_MAX = (1 << 31) - 1
+
+# Fixed point constants of gemmlowp's exp_on_negative_values, which the int8 softmax is built on: the
+# factor exp(-2**exponent) by which a set bit of the input scales the result, in Q31.
+EXP_BARREL_SHIFTER = ((-2, 1672461947), (-1, 1302514674), (0, 790015084), (1, 290630308), (2, 39332535), (3, 720401), (4, 242))
+# Integer bits of the softmax input differences and of the sum of their exponentials.
+SOFTMAX_DIFF_INTEGER_BITS = 5
+SOFTMAX_ACCUMULATION_INTEGER_BITS = 12
+
+
+# Method for the bytes of a TFLite model, from a .tflite file or from the C array of a source file
+# made with xxd -i, like micro_features_model.cpp.
+def read_model(path=MODEL_PATH):
+    if path.endswith(".tflite"):
+        with open(path, "rb") as model_file:
+            return model_file.read()
+    with open(path) as source_file:
+        source = source_file.read()
+    match = re.search(r"\[\]\s*=\s*\{(.*?)\}", source, re.DOTALL)
+    if match is None:
+        raise ValueError(f"{path} has no array of model bytes.")
+    return bytes(int(value, 16) for value in re.findall(r"0x([0-9a-fA-F]{1,2})", match.group(1)))
+
+# Method for the interpreter of the model at the given path.
+def load_model(path=MODEL_PATH):
+    return MicroModel(read_model(path))
+
+
+# Method for a real multiplier as a Q31 multiplier and a power of two shift, like QuantizeMultiplier.
+def quantize_multiplier(multiplier):
+    if multiplier == 0:
+        return 0, 0
+    fraction, shift = math.frexp(multiplier)
+    quantized = math.floor(fraction * (1 << 31) + 0.5)
+    if quantized == 1 << 31:
+        quantized //= 2
+        shift += 1
+    if shift < -31:
+        return 0, 0
+    return quantized, shift
+
+# Method for C's integer division by a power of two, which rounds towards zero, on int64 arrays:
+# negative values are biased up by one less than the divisor before the arithmetic shift.
+def truncating_shift(values, shift):
+    return (values + ((values >> 63) & ((1 << shift) - 1))) >> shift
+
+# Method for gemmlowp's SaturatingRoundingDoublingHighMul on int32 values held in int64 arrays: the
+# high 32 bits of twice the product, rounded to nearest. Only INT32_MIN times itself overflows, to
+# exactly 2**31, which saturates.
+def saturating_rounding_doubling_high_mul(a, b):
+    product = np.asarray(a, dtype=np.int64) * b
+    product += (1 << 30) + ((product >> 63) & (1 - (1 << 31)))
+    return np.minimum(truncating_shift(product, 31), INT32_MAX)
+
+# Method for gemmlowp's RoundingDivideByPOT, which rounds half away from zero.
+def rounding_divide_by_pot(values, exponent):
+    mask = (np.int64(1) << exponent) - 1
+    threshold = (mask >> 1) + (values < 0)
+    return (values >> exponent) + ((values & mask) > threshold)
+
+# Method for gemmlowp's SaturatingRoundingMultiplyByPOT with a positive exponent: a left shift that
+# saturates to the int32 range.
+def saturating_left_shift(values, exponent):
+    threshold = (1 << (31 - exponent)) - 1
+    return np.where(values > threshold, INT32_MAX, np.where(values < -threshold, INT32_MIN, values << exponent))
+
+# Method for MultiplyByQuantizedMultiplier: an int32 accumulator scaled by a Q31 multiplier and a
+# power of two, with the rounding of the reference kernels. Multipliers and shifts can be per channel.
+def multiply_by_quantized_multiplier(values, multiplier, shift):
+    scaled = saturating_rounding_doubling_high_mul(values << np.maximum(shift, 0), multiplier)
+    return rounding_divide_by_pot(scaled, np.maximum(-shift, 0))
+
+# Method for exp(a) of gemmlowp in Q31, for a in [-1/4, 0) in Q31, from a Taylor expansion around -1/8.
+def exp_on_interval_between_negative_one_quarter_and_0_excl(a):
+    x = a + (1 << 28)
+    x2 = saturating_rounding_doubling_high_mul(x, x)
+    x3 = saturating_rounding_doubling_high_mul(x2, x)
+    x4 = saturating_rounding_doubling_high_mul(x2, x2)
+    x4_over_4 = rounding_divide_by_pot(x4, 2)
+    polynomial = rounding_divide_by_pot(saturating_rounding_doubling_high_mul(x4_over_4 + x3, 715827883) + x2, 1)
+    return 1895147668 + saturating_rounding_doubling_high_mul(1895147668, x + polynomial)
+
+# Method for exp(a) of gemmlowp in Q31, for a <= 0 with SOFTMAX_DIFF_INTEGER_BITS integer bits: the
+# exponential of a modulo 1/4, scaled by the exponential of each higher bit of a.
+def exp_on_negative_values(a):
+    fractional_bits = 31 - SOFTMAX_DIFF_INTEGER_BITS
+    quarter = 1 << (fractional_bits - 2)
+    a_mod_quarter_minus_one_quarter = (a & (quarter - 1)) - quarter
+    result = exp_on_interval_between_negative_one_quarter_and_0_excl(a_mod_quarter_minus_one_quarter << SOFTMAX_DIFF_INTEGER_BITS)
+    remainder = a_mod_quarter_minus_one_quarter - a
+    for exponent, multiplier in EXP_BARREL_SHIFTER:
+        if SOFTMAX_DIFF_INTEGER_BITS > exponent:
+            selected = (remainder & (1 << (fractional_bits + exponent))) != 0
+            result = np.where(selected, saturating_rounding_doubling_high_mul(result, multiplier), result)
+    return np.where(a == 0, INT32_MAX, result)
+
+# Method for 1 / (1 + x) of gemmlowp in Q31, for x in [0, 1) in Q31, by Newton-Raphson division.
+def one_over_one_plus_x_for_x_in_0_1(a):
+    total = a + INT32_MAX
+    half_denominator = truncating_shift(total + np.where(total >= 0, 1, -1), 1)
+    x = 1515870810 + saturating_rounding_doubling_high_mul(half_denominator, -1010580540)
+    for _ in range(3):
+        one_minus_half_denominator_times_x = (1 << 29) - saturating_rounding_doubling_high_mul(half_denominator, x)
+        x = x + saturating_left_shift(saturating_rounding_doubling_high_mul(x, one_minus_half_denominator_times_x), 2)
+    return saturating_left_shift(x, 1)
+
+# Method for the float type whose matrix products of int8 values, offset by their zero points, are
+# exact for sums of the given number of products. BLAS runs these far faster than integer products,
+# and single precision is exact as long as no sum can reach 2**24.
+def exact_float_type(depth):
+    return np.float32 if depth * 255 * 255 < 1 << 24 else np.float64
+
+
+# A tensor of the model: its shape and type, its data for constant tensors and its quantization.
+class Tensor:
+    def __init__(self, name, shape, dtype, data=None, scale=(), zero_point=(), quantized_dimension=0):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.data = data
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.zero_point = np.asarray(zero_point, dtype=np.int64)
+        self.quantized_dimension = quantized_dimension
+
+
+# A table of a FlatBuffer, read in place. Fields are looked up by their index in the schema, and a
+# field left out of the table has the schema's default.
+class FlatTable:
+    def __init__(self, data, position):
+        self.data = data
+        self.position = position
+        vtable = position - struct.unpack_from("<i", data, position)[0]
+        vtable_size = struct.unpack_from("<H", data, vtable)[0]
+        self.field_offsets = struct.unpack_from(f"<{(vtable_size - 4) // 2}H", data, vtable + 4)
+
+    # Method for the position of a field in the buffer, or None for a field left out.
+    def field(self, index):
+        if index < len(self.field_offsets) and self.field_offsets[index]:
+            return self.position + self.field_offsets[index]
+        return None
+
+    def scalar(self, index, fmt, default=0):
+        position = self.field(index)
+        return default if position is None else struct.unpack_from("<" + fmt, self.data, position)[0]
+
+    # Method for the position a field of a table, vector or string type points at.
+    def target(self, index):
+        position = self.field(index)
+        return None if position is None else position + struct.unpack_from("<I", self.data, position)[0]
+
+    def table(self, index):
+        position = self.target(index)
+        return None if position is None else FlatTable(self.data, position)
+
+    # Method for a vector of scalars as a read-only array.
+    def vector(self, index, dtype):
+        position = self.target(index)
+        if position is None:
+            return np.zeros(0, dtype=dtype)
+        length = struct.unpack_from("<I", self.data, position)[0]
+        return np.frombuffer(self.data, dtype=dtype, count=length, offset=position + 4)
+
+    def tables(self, index):
+        position = self.target(index)
+        if position is None:
+            return []
+        length = struct.unpack_from("<I", self.data, position)[0]
+        elements = range(position + 4, position + 4 + 4 * length, 4)
+        return [FlatTable(self.data, element + struct.unpack_from("<I", self.data, element)[0]) for element in elements]
+
+    def string(self, index):
+        return bytes(self.vector(index, np.uint8)).decode("utf-8")
+
+
+# Host side interpreter for int8 TFLite models like the wake word model of the firmware. It runs the
+# reshape, depthwise convolution, fully connected and softmax kernels of TensorFlow Lite Micro with
+# the same integer arithmetic as their reference implementations, so its outputs are the board's,
+# but on a whole batch of inputs at once: the convolutions become matrix products over all samples,
+# and the fixed point softmax is computed on all rows together.
+class MicroModel:
+    def __init__(self, data):
+        if data[4:8] != b"TFL3":
+            raise ValueError("Model is not a TensorFlow Lite flatbuffer.")
+        model = FlatTable(data, struct.unpack_from("<I", data, 0)[0])
+        # Builtin codes above 127 are only in the newer field, older models only fill the deprecated one.
+        codes = [max(code.scalar(0, "b"), code.scalar(3, "i")) for code in model.tables(1)]
+        buffers = model.tables(4)
+        subgraphs = model.tables(2)
+        if len(subgraphs) != 1:
+            raise ValueError(f"Model has {len(subgraphs)} subgraphs, only one is supported.")
+        subgraph = subgraphs[0]
+
+        self.tensors = [self.read_tensor(tensor, buffers) for tensor in subgraph.tables(0)]
+        self.inputs = subgraph.vector(1, "<i4").tolist()
+        self.outputs = subgraph.vector(2, "<i4").tolist()
+        if len(self.inputs) != 1 or len(self.outputs) != 1:
+            raise ValueError("Only models with one input and one output are supported.")
+
+        kernels = {
+            DEPTHWISE_CONV_2D: (self.prepare_depthwise_conv_2d, self.depthwise_conv_2d),
+            FULLY_CONNECTED: (self.prepare_fully_connected, self.fully_connected),
+            RESHAPE: (self.prepare_reshape, self.reshape),
+            SOFTMAX: (self.prepare_softmax, self.softmax),
+        }
+        # Each operator as its kernel, input and output tensors and the parameters worked out for it.
+        self.operators = []
+        for operator in subgraph.tables(3):
+            code = codes[operator.scalar(0, "I")]
+            if code not in kernels:
+                raise ValueError(f"Operator with builtin code {code} is not supported.")
+            prepare, kernel = kernels[code]
+            inputs = operator.vector(1, "<i4").tolist()
+            outputs = operator.vector(2, "<i4").tolist()
+            options = operator.table(4)
+            self.operators.append((kernel, inputs, outputs, prepare(inputs, outputs, options)))
+
+    # Method for a tensor of the subgraph, with the data of its buffer if it is a constant.
+    def read_tensor(self, tensor, buffers):
+        type_code = tensor.scalar(1, "b")
+        if type_code not in TENSOR_TYPES:
+            raise ValueError(f"Tensor type {type_code} is not supported.")
+        dtype = np.dtype(TENSOR_TYPES[type_code]).newbyteorder("<")
+        shape = tensor.vector(0, "<i4").tolist()
+
+        buffer = buffers[tensor.scalar(2, "I")]
+        raw = bytes(buffer.vector(0, np.uint8))
+        # Models above 2 GB keep their buffers after the flatbuffer, at an offset from its start.
+        offset = buffer.scalar(1, "Q")
+        if not raw and offset > 1:
+            raw = buffer.data[offset:offset + buffer.scalar(2, "Q")]
+        data = np.frombuffer(raw, dtype=dtype).reshape(shape) if raw else None
+
+        quantization = tensor.table(4)
+        if quantization is None:
+            return Tensor(tensor.string(3), shape, dtype, data)
+        return Tensor(tensor.string(3), shape, dtype, data, quantization.vector(2, "<f4"), quantization.vector(3, "<i8"),
+                      quantization.scalar(6, "i"))
+
+    # Method for the int8 range left by a fused activation, like CalculateActivationRangeQuantized.
+    def activation_range(self, activation, output):
+        scale = float(output.scale[0])
+        zero_point = int(output.zero_point[0])
+        def quantize(value):
+            return zero_point + int(math.copysign(math.floor(abs(value / scale) + 0.5), value))
+        if activation == ACTIVATION_NONE:
+            return -128, 127
+        if activation == ACTIVATION_RELU:
+            return max(-128, quantize(0.0)), 127
+        if activation == ACTIVATION_RELU6:
+            return max(-128, quantize(0.0)), min(127, quantize(6.0))
+        if activation == ACTIVATION_RELU_N1_TO_1:
+            return max(-128, quantize(-1.0)), min(127, quantize(1.0))
+        raise ValueError(f"Fused activation {activation} is not supported.")
+
+    # Method for the per channel multipliers and shifts that scale int32 accumulators of an int8
+    # convolution to the output, like PopulateConvolutionQuantizationParams.
+    def output_multipliers(self, input, filter, output, channels):
+        scales = np.broadcast_to(filter.scale, (channels,))
+        quantized = [quantize_multiplier(float(input.scale[0]) * float(scale) / float(output.scale[0])) for scale in scales]
+        return np.array([multiplier for multiplier, _ in quantized], dtype=np.int64), np.array([shift for _, shift in quantized], dtype=np.int64)
+
+    # Method for the int8 output of a convolution from its int32 accumulators.
+    def requantize(self, accumulators, parameters):
+        values = multiply_by_quantized_multiplier(accumulators, parameters["multiplier"], parameters["shift"])
+        return np.clip(values + parameters["output_offset"], *parameters["activation_range"]).astype(np.int8)
+
+    def prepare_depthwise_conv_2d(self, inputs, outputs, options):
+        input, filter, output = self.tensors[inputs[0]], self.tensors[inputs[1]], self.tensors[outputs[0]]
+        bias = self.tensors[inputs[2]].data if len(inputs) > 2 and inputs[2] >= 0 else None
+        _, filter_height, filter_width, channels = filter.shape
+        multiplier, shift = self.output_multipliers(input, filter, output, channels)
+        stride_height, stride_width = options.scalar(2, "i"), options.scalar(1, "i")
+        dilation_height, dilation_width = options.scalar(6, "i", 1), options.scalar(5, "i", 1)
+
+        # Padding as ComputePaddingHeightWidth lays it out, any odd pixel going after the input.
+        padding = []
+        for size, filter_size, stride, dilation in ((input.shape[1], filter_height, stride_height, dilation_height),
+                                                    (input.shape[2], filter_width, stride_width, dilation_width)):
+            dilated = (filter_size - 1) * dilation + 1
+            if options.scalar(0, "b") == PADDING_SAME:
+                output_size = (size + stride - 1) // stride
+            else:
+                output_size = (size - dilated + stride) // stride
+            total = max((output_size - 1) * stride + dilated - size, 0)
+            padding.append((total // 2, total - total // 2, output_size))
+
+        depth_multiplier = channels // input.shape[3]
+        dtype = exact_float_type(filter_height * filter_width)
+        return {
+            "input_offset": -int(input.zero_point[0]),
+            "dtype": dtype,
+            # Filter taps of each input channel as a matrix to its depth_multiplier output channels.
+            "filter": filter.data.reshape(filter_height * filter_width, input.shape[3], depth_multiplier).transpose(1, 0, 2).astype(dtype),
+            "bias": np.zeros(channels, dtype=np.int64) if bias is None else bias.astype(np.int64),
+            "multiplier": multiplier,
+            "shift": shift,
+            "output_offset": int(output.zero_point[0]),
+            "activation_range": self.activation_range(options.scalar(4, "b"), output),
+            "filter_size": (filter_height, filter_width),
+            "stride": (stride_height, stride_width),
+            "dilation": (dilation_height, dilation_width),
+            "padding": padding,
+        }
+
+    # Method for DepthwiseConv2D on a batch: the padded input, offset to zero, is cut into the patches
+    # of all output pixels, and each input channel's patches multiplied by its filter taps at once.
+    def depthwise_conv_2d(self, values, parameters):
+        (top, bottom, output_height), (left, right, output_width) = parameters["padding"]
+        filter_height, filter_width = parameters["filter_size"]
+        stride_height, stride_width = parameters["stride"]
+        dilation_height, dilation_width = parameters["dilation"]
+
+        padded = np.pad(values[0].astype(parameters["dtype"]) + parameters["input_offset"], ((0, 0), (top, bottom), (left, right), (0, 0)))
+        patches = np.lib.stride_tricks.sliding_window_view(padded, ((filter_height - 1) * dilation_height + 1, (filter_width - 1) * dilation_width + 1), axis=(1, 2))
+        patches = patches[:, ::stride_height, ::stride_width, :, ::dilation_height, ::dilation_width][:, :output_height, :output_width]
+        batch, channels = len(patches), patches.shape[3]
+        patches = patches.transpose(3, 0, 1, 2, 4, 5).reshape(channels, -1, filter_height * filter_width)
+
+        accumulators = (patches @ parameters["filter"]).astype(np.int64).transpose(1, 0, 2).reshape(batch, output_height, output_width, -1)
+        return self.requantize(accumulators + parameters["bias"], parameters)
+
+    def prepare_fully_connected(self, inputs, outputs, options):
+        input, filter, output = self.tensors[inputs[0]], self.tensors[inputs[1]], self.tensors[outputs[0]]
+        bias = self.tensors[inputs[2]].data if len(inputs) > 2 and inputs[2] >= 0 else None
+        units, depth = filter.shape
+        multiplier, shift = self.output_multipliers(input, filter, output, units)
+        filter_offset = -np.broadcast_to(filter.zero_point, (units,))
+        dtype = exact_float_type(depth)
+        return {
+            "input_offset": -int(input.zero_point[0]),
+            "dtype": dtype,
+            "filter": (filter.data.astype(np.int64) + filter_offset[:, np.newaxis]).T.astype(dtype),
+            "bias": np.zeros(units, dtype=np.int64) if bias is None else bias.astype(np.int64),
+            "multiplier": multiplier,
+            "shift": shift,
+            "output_offset": int(output.zero_point[0]),
+            "activation_range": self.activation_range(options.scalar(0, "b"), output),
+            "depth": depth,
+        }
+
+    # Method for FullyConnected on a batch, each sample flattened to the depth of the weights.
+    def fully_connected(self, values, parameters):
+        input = values[0].reshape(-1, parameters["depth"]).astype(parameters["dtype"]) + parameters["input_offset"]
+        return self.requantize((input @ parameters["filter"]).astype(np.int64) + parameters["bias"], parameters)
+
+    def prepare_reshape(self, inputs, outputs, options):
+        return {"shape": self.tensors[outputs[0]].shape[1:]}
+
+    # Method for Reshape on a batch, to the output tensor's shape with the batch in place of its first
+    # dimension.
+    def reshape(self, values, parameters):
+        return values[0].reshape((len(values[0]),) + parameters["shape"])
+
+    def prepare_softmax(self, inputs, outputs, options):
+        input, output = self.tensors[inputs[0]], self.tensors[outputs[0]]
+        if input.dtype != np.int8 or float(output.scale[0]) != 1 / 256 or int(output.zero_point[0]) != -128:
+            raise ValueError("Only int8 softmax with an output scale of 1/256 and zero point of -128 is supported.")
+        # PreprocessSoftmaxScaling and CalculateInputRadius.
+        beta = options.scalar(0, "f", 1.0) if options is not None else 1.0
+        real_multiplier = min(beta * float(input.scale[0]) * (1 << (31 - SOFTMAX_DIFF_INTEGER_BITS)), (1 << 31) - 1.0)
+        multiplier, left_shift = quantize_multiplier(real_multiplier)
+        radius = math.floor(((1 << SOFTMAX_DIFF_INTEGER_BITS) - 1) * (1 << (31 - SOFTMAX_DIFF_INTEGER_BITS)) / (1 << left_shift))
+        return {"multiplier": multiplier, "left_shift": left_shift, "diff_min": -radius}
+
+    # Method for the int8 Softmax of the reference kernels over the last dimension: the differences to
+    # each row's maximum are scaled by beta, exponentiated and normalized in gemmlowp fixed point.
+    # Differences too large to matter come out as the lowest output.
+    def softmax(self, values, parameters):
+        input = values[0].astype(np.int64)
+        differences = input - input.max(axis=-1, keepdims=True)
+        kept = differences >= parameters["diff_min"]
+        rescaled = saturating_rounding_doubling_high_mul(differences << parameters["left_shift"], parameters["multiplier"])
+        exponentials = exp_on_negative_values(rescaled)
+        sum_of_exponentials = np.where(kept, rounding_divide_by_pot(exponentials, SOFTMAX_ACCUMULATION_INTEGER_BITS), 0).sum(axis=-1, keepdims=True)
+
+        # GetReciprocal: the sum scaled into [1, 2), and its reciprocal in Q31.
+        headroom_plus_one = 32 - np.frexp(sum_of_exponentials.astype(np.float64))[1].astype(np.int64)
+        bits_over_unit = SOFTMAX_ACCUMULATION_INTEGER_BITS - headroom_plus_one
+        shifted_scale = one_over_one_plus_x_for_x_in_0_1(((sum_of_exponentials << headroom_plus_one) & 0xFFFFFFFF) - (1 << 31))
+
+        scaled = rounding_divide_by_pot(saturating_rounding_doubling_high_mul(shifted_scale, exponentials), bits_over_unit + 31 - 8)
+        return np.where(kept, np.clip(scaled - 128, -128, 127), -128).astype(np.int8)
+
+    # Method for the int8 outputs of the model for one input or a batch of them: an int8 array whose
+    # trailing dimensions hold one input each, e.g. spectrograms shaped (..., 49, 40) or flattened to
+    # (..., 1960). Returns the outputs shaped (..., outputs).
+    def invoke(self, inputs):
+        inputs = np.asarray(inputs)
+        input_tensor = self.tensors[self.inputs[0]]
+        if inputs.dtype != input_tensor.dtype:
+            raise ValueError(f"Model input is {input_tensor.dtype}, not {inputs.dtype}.")
+        input_size = math.prod(input_tensor.shape[1:])
+        split = inputs.ndim
+        size = 1
+        while split > 0 and size < input_size:
+            split -= 1
+            size *= inputs.shape[split]
+        if size != input_size:
+            raise ValueError(f"Inputs of shape {inputs.shape} do not hold inputs of {input_size} values.")
+
+        batch = inputs.reshape((-1,) + input_tensor.shape[1:])
+        results = [self.run(batch[start:start + MODEL_BLOCK_SIZE]) for start in range(0, len(batch), MODEL_BLOCK_SIZE)]
+        output = np.concatenate(results) if results else np.empty((0,) + self.tensors[self.outputs[0]].shape[1:], dtype=np.int8)
+        return output.reshape(inputs.shape[:split] + output.shape[1:])
+
+    # Method for running the operators in order on a block of inputs.
+    def run(self, batch):
+        values = {self.inputs[0]: batch}
+        for kernel, inputs, outputs, parameters in self.operators:
+            operands = [values[index] if index in values else self.tensors[index].data for index in inputs if index >= 0]
+            values[outputs[0]] = kernel(operands, parameters)
+        return values[self.outputs[0]]
+
+    # Method for the label the model scores highest for each input, e.g. "yes" for the int8 features
+    # of micro_speech_BLE/data/yes_1000ms.wav.
+    def labels(self, inputs):
+        return np.array(MODEL_LABELS)[self.invoke(inputs).argmax(axis=-1)]